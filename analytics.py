@@ -0,0 +1,343 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Gameplay events and session analytics.
+#
+# The game reports what happens on an EventBus; listeners get each event as
+# a dict ({"t": unix time, "event": kind, ...fields}). With no listener, an
+# event costs a function call.
+#
+#    bus = EventBus()
+#    log = EventLog("analytics")
+#    bus.listen(log)
+#    bus.emit("fruit", fruit="APPLE", score=3)
+#    ...
+#    log.close()
+#
+# EventLog keeps the events in memory and hands them over in batches (every
+# BATCH_SIZE events) to a writer thread, which encodes them as JSON lines and
+# appends them to the log files. The game loop never touches a file. The
+# writer also wakes up every FLUSH_INTERVAL seconds with no batch and takes
+# the events kept since, so that none waits longer, even in an idle game. A file is closed once it passes ROTATE_BYTES
+# and the next batch starts a new one; names carry the session start time
+# and a sequence number, so logs from many sessions can share a directory.
+#
+# Events sent by sucury.py:
+#
+#    session_start   session (id)
+#    game_start      mode (play, auto, replay), cols, rows
+#    fruit           fruit (APPLE, PEAR, BLUEBERRY, ORANGE), score, tick
+#    speed           speed (moves per second), previous
+#    death           cause (wall, bite), score, tick
+#    win             score, tick
+#    best_score      score (a new best for the session)
+#    pause           paused (true, false)
+#    color_menu      open (true, false)
+#    session_end     best, games, seconds
+#
+# Every event also carries the session id.
+#
+#    python3 analytics.py analytics/ [--json summary.json]
+#
+# aggregates logs (files or directories) in one streaming pass: files are
+# shared out among worker processes, read line by line, and only counters
+# are kept, so memory does not grow with the number of sessions.
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+BATCH_SIZE = 256         # Events kept in memory before they are handed to the writer.
+FLUSH_INTERVAL = 5       # Seconds an event may wait in memory.
+ROTATE_BYTES = 8 << 20   # Size at which a log file is closed and the next one started.
+
+FRUIT_NAMES = ("APPLE", "PEAR", "BLUEBERRY", "ORANGE")   # By engine fruit type.
+
+class EventBus:
+
+    def __init__(self):
+        self.listeners = []
+
+    def listen(self, listener):
+        self.listeners.append(listener)
+
+    def emit(self, kind, **fields):
+        if self.listeners:
+            event = {"t": round(time.time(), 3), "event": kind}
+            event.update(fields)
+            for listener in self.listeners:
+                listener(event)
+
+##
+## Logging.
+##
+
+class EventLog:
+
+    def __init__(self, directory, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 rotate_bytes=ROTATE_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.prefix = f"events-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+        self.batch = []
+        self.lock = threading.Lock()           # The batch is taken by the writer too.
+        self.batches = queue.SimpleQueue()     # Batches to write, then None to stop.
+        self.error = None                      # Why writing stopped, if it failed.
+        self.thread = threading.Thread(target=self.write_batches, name="analytics", daemon=True)
+        self.thread.start()
+
+    # A listener of the bus.
+
+    def __call__(self, event):
+        with self.lock:
+            self.batch.append(event)
+            if len(self.batch) >= self.batch_size:
+                self.batches.put(self.batch)
+                self.batch = []
+
+    def flush(self):
+        batch = self.take()
+        if batch:
+            self.batches.put(batch)
+
+    # The events kept so far (from any thread).
+
+    def take(self):
+        with self.lock:
+            batch, self.batch = self.batch, []
+        return batch
+
+    # Write what is left and stop the writer.
+
+    def close(self):
+        self.flush()
+        self.batches.put(None)
+        self.thread.join()
+
+    # In the writer thread.
+
+    def write_batches(self):
+        file, number = None, 0
+        while True:
+            try:
+                batch = self.batches.get(timeout=self.flush_interval)
+            except queue.Empty:                  # Quiet for a while: write what is kept.
+                batch = self.take()
+                if not batch:
+                    continue
+            if batch is None:
+                break
+            if self.error is not None:
+                continue
+            data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in batch).encode()
+            try:
+                if file is None or file.tell() >= self.rotate_bytes:
+                    if file is not None:
+                        file.close()
+                    number += 1
+                    file = open(os.path.join(self.directory, f"{self.prefix}-{number:04}.jsonl"), "ab")
+                file.write(data)
+                file.flush()
+            except OSError as error:
+                self.error = error
+        if file is not None:
+            file.close()
+
+##
+## Aggregation.
+##
+
+# Counters over any number of events; summaries of separate logs can be
+# merged.
+
+class Summary:
+
+    def __init__(self):
+        self.events = 0
+        self.bad_lines = 0
+        self.sessions = 0
+        self.session_seconds = 0
+        self.games = {}            # Mode -> games started.
+        self.deaths = {}           # Cause -> deaths.
+        self.wins = 0
+        self.fruits = {}           # Fruit name -> eaten.
+        self.speeds = {}           # Speed reached -> times.
+        self.pauses = 0
+        self.color_menus = 0
+        self.final_scores = {}     # Score at the end of a game -> games.
+        self.best_scores = {}      # Best score of a session -> sessions.
+
+    # Fields are checked before anything is counted: a field of the wrong
+    # type raises TypeError and the event is left out whole.
+
+    def add(self, event):
+        kind = event.get("event")
+        if kind == "fruit":
+            count(self.fruits, field(event, "fruit", str))
+        elif kind == "speed":
+            count(self.speeds, field(event, "speed", int))
+        elif kind == "death":
+            cause, score = field(event, "cause", str), field(event, "score", int)
+            count(self.deaths, cause)
+            count(self.final_scores, score)
+        elif kind == "win":
+            score = field(event, "score", int)
+            self.wins += 1
+            count(self.final_scores, score)
+        elif kind == "game_start":
+            count(self.games, field(event, "mode", str))
+        elif kind == "pause":
+            self.pauses += event.get("paused") is True
+        elif kind == "color_menu":
+            self.color_menus += event.get("open") is True
+        elif kind == "session_start":
+            self.sessions += 1
+        elif kind == "session_end":
+            seconds, best = field(event, "seconds", (int, float)), field(event, "best", int)
+            self.session_seconds += seconds or 0
+            count(self.best_scores, best)
+        self.events += 1
+
+    def merge(self, other):
+        for name, value in vars(other).items():
+            if isinstance(value, dict):
+                mine = getattr(self, name)
+                for key, number in value.items():
+                    mine[key] = mine.get(key, 0) + number
+            else:
+                setattr(self, name, getattr(self, name) + value)
+
+    def report(self):
+        games = sum(self.games.values())
+        ended = sum(self.final_scores.values())
+        return {
+            "events": self.events,
+            "bad_lines": self.bad_lines,
+            "sessions": self.sessions,
+            "mean_session_seconds": self.session_seconds / self.sessions if self.sessions else 0,
+            "games": self.games,
+            "games_per_session": games / self.sessions if self.sessions else 0,
+            "deaths": self.deaths,
+            "wins": self.wins,
+            "fruits": self.fruits,
+            "speeds": sort_keys(self.speeds),
+            "pauses": self.pauses,
+            "color_menus": self.color_menus,
+            "mean_final_score": sum(score * number for score, number in self.final_scores.items()) / ended if ended else 0,
+            "final_score_percentiles": histogram_percentiles(self.final_scores),
+            "best_score_percentiles": histogram_percentiles(self.best_scores),
+        }
+
+# A field of an event (None if missing), checked against the type the
+# game writes.
+
+def field(event, name, kind):
+    value = event.get(name)
+    if value is not None and not isinstance(value, kind):
+        raise TypeError(f"{name} is a {type(value).__name__}")
+    return value
+
+def count(counter, key):
+    if key is not None:
+        counter[key] = counter.get(key, 0) + 1
+
+def sort_keys(counter):
+    return {key: counter[key] for key in sorted(counter)}
+
+# Percentiles of values given as value -> count.
+
+def histogram_percentiles(counter, fractions=(0.5, 0.9, 0.99)):
+    total = sum(counter.values())
+    result = {}
+    if not total:
+        return result
+    ordered = sorted(counter.items())
+    for fraction in fractions:
+        rank, seen = min(int(fraction * total), total - 1), 0
+        for value, number in ordered:
+            seen += number
+            if seen > rank:
+                result[f"p{round(fraction * 100)}"] = value
+                break
+    result["max"] = ordered[-1][0]
+    return result
+
+# Aggregate one log file (in a worker process).
+
+def summarize_file(path):
+    summary = Summary()
+    loads = json.loads
+    with open(path, "rb") as file:
+        for line in file:
+            try:
+                summary.add(loads(line))
+            except (ValueError, AttributeError, TypeError):   # E.g. a line cut short by a crash.
+                summary.bad_lines += 1
+    return summary
+
+def log_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.jsonl")))
+        else:
+            files.append(path)
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate Sucury event logs.")
+    parser.add_argument("paths", nargs="+", help="log files, or directories of *.jsonl logs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args()
+
+    files = log_files(args.paths)
+    if not files:
+        sys.exit("analytics: no log files found")
+
+    start = time.perf_counter()
+    total = Summary()
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            for summary in pool.imap_unordered(summarize_file, files):
+                total.merge(summary)
+    except OSError as error:
+        sys.exit(f"analytics: {error}")
+    elapsed = time.perf_counter() - start
+
+    report = total.report()
+    print(json.dumps(report, indent=2))
+    print(f"{len(files)} files, {total.events:,} events in {elapsed:.2f} s "
+          f"({total.events / elapsed:,.0f} events/s)", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
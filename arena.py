@@ -0,0 +1,438 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The shared arena: many snakes on one board, as played over the network
+# (see arena_server.py), with no display attached.
+#
+#    arena = Arena(64, 64, seed=42)
+#    player = arena.add_snake()
+#    arena.steer(player, engine.UP)
+#    delta = arena.step()
+#
+# All snakes move at once, one move per tick (the tick rate is the server's,
+# so pears and blueberries just grow the snake, like apples). A snake dies
+# crashing into the border, into any snake, or head-on with another one,
+# and comes back after RESPAWN_TICKS. Each tick returns a Delta: what
+# changed, and nothing else. That is all clients are sent, so the traffic
+# depends on the number of snakes, not on their lengths nor the board size.
+#
+# Wire format. Every message is framed as a type byte and the payload size
+# (FRAME). Integers in payloads are unsigned LEB128 varints (as in
+# replay.py); cells are packed as y*cols + x, as in engine.py.
+#
+#    HELLO    client -> server, once: 1 to play, 0 to watch
+#    TURN     client -> server: a direction code (index into engine.DIRECTIONS)
+#    WELCOME  server -> client, once: the player's snake id (0: watching),
+#             cols, rows, tick period (us), tick, the snakes (count, then id,
+#             length and cells from the tail end to the head for each) and
+#             the fruits (count, then cell << 2 | type for each)
+#    TICK     server -> client, every tick: tick, then four lists, each one
+#             a count followed by its items:
+#               deaths  snake ids (their whole body is gone)
+#               moves   id << 3 | tail moved << 2 | direction, for each
+#                       snake that moved (its head went one cell further)
+#               births  id, cell: snakes (re)spawned as a head on the cell
+#               fruits  cell << 2 | type: fruits dropped
+#             A head moving onto a fruit eats it.
+#
+# A client mirrors the arena with a View, applying the deltas in the order
+# the server made them: deaths, tail ends, heads, births and fruits.
+
+import random
+import struct
+from array import array
+from collections import deque
+
+import engine
+from replay import ReplayError, read_varint, write_varint
+
+FRUITS = 8            # Fruits on the board at any time (if there is room).
+RESPAWN_TICKS = 20    # Ticks a dead snake waits before coming back.
+SPAWN_TRIES = 64      # Random draws to find a cell free of snakes and fruit.
+
+# Segments each fruit adds (with a single tick rate, fruit cannot change
+# the speed of one snake).
+
+GROWTH = {engine.APPLE: 1, engine.PEAR: 1, engine.BLUEBERRY: 1, engine.ORANGE: 2}
+
+# Message types.
+
+HELLO   = 1
+TURN    = 2
+WELCOME = 3
+TICK    = 4
+
+FRAME = struct.Struct("<BI")   # Message type, payload size.
+
+MAX_MESSAGE = 1 << 26          # Larger payloads are refused (a broken or hostile peer).
+
+# Direction <-> 2-bit code.
+
+DIRECTION_CODES = {direction: code for code, direction in enumerate(engine.DIRECTIONS)}
+
+class ProtocolError(Exception):
+    pass
+
+##
+## The arena.
+##
+
+class ArenaSnake:
+
+    __slots__ = ("id", "body", "direction", "queue", "growth", "alive", "respawn", "removed")
+
+    def __init__(self, snake_id, respawn):
+        self.id = snake_id
+        self.body = deque()        # Cells, from the tail end to the head.
+        self.direction = engine.RIGHT
+        self.queue = deque(maxlen=engine.MOVEMENT_QUEUE_SIZE)
+        self.growth = 0
+        self.alive = False
+        self.respawn = respawn     # Tick at which a dead snake comes back.
+        self.removed = False       # The player left: gone on the next tick.
+
+# What changed in one tick (see the wire format above).
+
+class Delta:
+
+    __slots__ = ("tick", "deaths", "moves", "births", "fruits")
+
+    def __init__(self, tick):
+        self.tick = tick
+        self.deaths = []   # Snake ids.
+        self.moves = []    # id << 3 | tail moved << 2 | direction code.
+        self.births = []   # (id, cell) pairs.
+        self.fruits = []   # (cell, type) pairs.
+
+class Arena:
+
+    def __init__(self, cols, rows, seed=None, fruits=FRUITS):
+        self.cols, self.rows = cols, rows
+        self.rng = random.Random(seed)
+        cells = cols * rows
+
+        # The same occupancy grid and free-cell index as engine.GameState
+        # (so engine.occupy() and engine.release() work on the arena), shared
+        # by all the snakes.
+
+        self.occupied = bytearray(cells)
+        self.free = array("i", range(cells))
+        self.free_slot = array("i", range(cells))
+
+        self.snakes = {}           # Id -> ArenaSnake.
+        self.next_id = 1
+        self.fruits = {}           # Cell -> fruit type.
+        self.fruit_count = fruits
+        self.tick = 0
+
+        while len(self.fruits) < self.fruit_count and self.spawn_fruit():
+            pass
+
+    # A new snake, spawned on the next tick. Returns its id.
+
+    def add_snake(self):
+        snake = ArenaSnake(self.next_id, self.tick)
+        self.snakes[snake.id] = snake
+        self.next_id += 1
+        return snake.id
+
+    # Take a snake out of the arena (on the next tick).
+
+    def remove_snake(self, snake_id):
+        snake = self.snakes.get(snake_id)
+        if snake is not None:
+            snake.removed = True
+
+    # Queue a turn for a snake, taken on one of its next moves.
+
+    def steer(self, snake_id, direction):
+        snake = self.snakes.get(snake_id)
+        if snake is not None and snake.alive:
+            snake.queue.append(direction)
+
+    # A random cell free of snakes and fruit, or None if none was found.
+
+    def free_cell(self):
+        free = self.free
+        for _ in range(SPAWN_TRIES):
+            if not free:
+                return None
+            cell = free[self.rng.randrange(len(free))]
+            if cell not in self.fruits:
+                return cell
+        return None
+
+    def spawn_fruit(self):
+        cell = self.free_cell()
+        if cell is None:
+            return None
+        kind = self.fruits[cell] = self.rng.randrange(engine.FRUIT_TYPES)
+        return cell, kind
+
+    def kill(self, snake, delta):
+        for cell in snake.body:
+            engine.release(self, cell)
+        snake.body.clear()
+        snake.queue.clear()
+        snake.growth = 0
+        snake.alive = False
+        snake.respawn = self.tick + RESPAWN_TICKS
+        delta.deaths.append(snake.id)
+
+    # Advance every snake by one move. Returns the Delta of the tick.
+    #
+    # The moves are simultaneous: the tail ends move away before the heads
+    # move in (so a snake can follow any tail), and whether a head survives
+    # is decided for all of them before any body is cleared. The result
+    # does not depend on the order of the snakes.
+
+    def step(self):
+        self.tick += 1
+        delta = Delta(self.tick)
+        cols, rows = self.cols, self.rows
+
+        # Leaving snakes, and heads crashing into the border.
+
+        moving = []
+        for snake in list(self.snakes.values()):
+            if snake.removed:
+                if snake.alive:
+                    self.kill(snake, delta)
+                del self.snakes[snake.id]
+                continue
+            if not snake.alive:
+                continue
+            if snake.queue:
+                snake.direction = snake.queue.popleft()
+            xmov, ymov = snake.direction
+            y, x = divmod(snake.body[-1], cols)
+            x += xmov
+            y += ymov
+            if x < 0 or y < 0 or x >= cols or y >= rows:
+                self.kill(snake, delta)
+            else:
+                moving.append((snake, y*cols + x))
+
+        # Tail ends move away, unless the snake is growing.
+
+        tails = []
+        for snake, head in moving:
+            if snake.growth:
+                snake.growth -= 1
+                tails.append(0)
+            else:
+                engine.release(self, snake.body.popleft())
+                tails.append(1)
+
+        # Heads into a snake, or into the same cell as another head, die.
+
+        targets = {}
+        for snake, head in moving:
+            targets[head] = targets.get(head, 0) + 1
+        survives = [not self.occupied[head] and targets[head] == 1 for snake, head in moving]
+
+        for (snake, head), alive in zip(moving, survives):
+            if not alive:
+                self.kill(snake, delta)
+
+        for (snake, head), alive, tail in zip(moving, survives, tails):
+            if not alive:
+                continue
+            engine.occupy(self, head)
+            snake.body.append(head)
+            delta.moves.append(snake.id << 3 | tail << 2 | DIRECTION_CODES[snake.direction])
+            kind = self.fruits.pop(head, None)
+            if kind is not None:
+                snake.growth += GROWTH[kind]
+
+        # Dead snakes come back (if there is room) and eaten fruit is
+        # replaced.
+
+        for snake in self.snakes.values():
+            if not snake.alive and snake.respawn <= self.tick:
+                cell = self.free_cell()
+                if cell is None:
+                    break
+                engine.occupy(self, cell)
+                snake.body.append(cell)
+                x = cell % cols
+                snake.direction = engine.LEFT if x > cols / 2 else engine.RIGHT
+                snake.alive = True
+                delta.births.append((snake.id, cell))
+
+        while len(self.fruits) < self.fruit_count:
+            fruit = self.spawn_fruit()
+            if fruit is None:
+                break
+            delta.fruits.append(fruit)
+
+        return delta
+
+##
+## Messages.
+##
+
+def frame(kind, payload):
+    return FRAME.pack(kind, len(payload)) + payload
+
+# Read one message from an asyncio stream. Returns (type, payload).
+
+async def read_message(reader):
+    kind, size = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if size > MAX_MESSAGE:
+        raise ProtocolError(f"message too large ({size} bytes)")
+    return kind, await reader.readexactly(size)
+
+def encode_welcome(arena, player, period_us):
+    out = bytearray()
+    for value in (player or 0, arena.cols, arena.rows, period_us, arena.tick):
+        write_varint(out, value)
+
+    alive = [snake for snake in arena.snakes.values() if snake.alive]
+    write_varint(out, len(alive))
+    for snake in alive:
+        write_varint(out, snake.id)
+        write_varint(out, len(snake.body))
+        for cell in snake.body:
+            write_varint(out, cell)
+
+    write_varint(out, len(arena.fruits))
+    for cell, kind in arena.fruits.items():
+        write_varint(out, cell << 2 | kind)
+    return bytes(out)
+
+def encode_delta(delta):
+    out = bytearray()
+    write_varint(out, delta.tick)
+    write_varint(out, len(delta.deaths))
+    for snake_id in delta.deaths:
+        write_varint(out, snake_id)
+    write_varint(out, len(delta.moves))
+    for move in delta.moves:
+        write_varint(out, move)
+    write_varint(out, len(delta.births))
+    for snake_id, cell in delta.births:
+        write_varint(out, snake_id)
+        write_varint(out, cell)
+    write_varint(out, len(delta.fruits))
+    for cell, kind in delta.fruits:
+        write_varint(out, cell << 2 | kind)
+    return bytes(out)
+
+##
+## The client side.
+##
+
+# The arena as a client sees it, rebuilt from the WELCOME message and kept
+# up to date by the TICK messages.
+
+class View:
+
+    def __init__(self, welcome):
+        try:
+            values = iter_varints(welcome)
+            self.player = next(values) or None
+            self.cols, self.rows, self.period_us, self.tick = [next(values) for _ in range(4)]
+
+            # Who covers each cell (0: nobody).
+            self.occupant = array("i", bytes(4 * self.cols * self.rows))
+
+            self.snakes = {}       # Id -> deque of cells, from the tail end to the head.
+            for _ in range(next(values)):
+                snake_id = next(values)
+                body = self.snakes[snake_id] = deque([next(values) for _ in range(next(values))])
+                for cell in body:
+                    self.occupant[cell] = snake_id
+
+            self.fruits = {}       # Cell -> fruit type.
+            for _ in range(next(values)):
+                value = next(values)
+                self.fruits[value >> 2] = value & 3
+        except (StopIteration, IndexError) as error:
+            raise ProtocolError("malformed welcome") from error
+
+    # Apply the payload of a TICK message. Returns the cells that changed
+    # (possibly repeated), for drawing.
+
+    def apply(self, payload):
+        try:
+            return self.apply_delta(iter_varints(payload))
+        except (StopIteration, IndexError, KeyError) as error:
+            raise ProtocolError("malformed tick") from error
+
+    def apply_delta(self, values):
+        occupant, snakes, fruits, cols = self.occupant, self.snakes, self.fruits, self.cols
+        tick = next(values)
+        if tick != self.tick + 1:
+            raise ProtocolError(f"tick {tick} after {self.tick}")
+        self.tick = tick
+        changed = []
+
+        for _ in range(next(values)):
+            body = snakes.pop(next(values))
+            for cell in body:
+                occupant[cell] = 0
+            changed += body
+
+        # Where the heads go (before the tail ends move: a snake of one
+        # cell has its head as tail end).
+
+        moves = []
+        for _ in range(next(values)):
+            move = next(values)
+            body = snakes[move >> 3]
+            xmov, ymov = engine.DIRECTIONS[move & 3]
+            moves.append((move, body, body[-1] + ymov*cols + xmov))
+            changed.append(body[-1])
+
+        for move, body, head in moves:
+            if move & 4:
+                cell = body.popleft()
+                occupant[cell] = 0
+                changed.append(cell)
+
+        for move, body, head in moves:
+            if occupant[head]:
+                raise ProtocolError(f"snake {move >> 3} moved into snake {occupant[head]}")
+            occupant[head] = move >> 3
+            body.append(head)
+            fruits.pop(head, None)
+            changed.append(head)
+
+        for _ in range(next(values)):
+            snake_id, cell = next(values), next(values)
+            snakes[snake_id] = deque((cell,))
+            occupant[cell] = snake_id
+            changed.append(cell)
+
+        for _ in range(next(values)):
+            value = next(values)
+            fruits[value >> 2] = value & 3
+            changed.append(value >> 2)
+
+        return changed
+
+def iter_varints(data):
+    pos = 0
+    while pos < len(data):
+        try:
+            value, pos = read_varint(data, pos)
+        except ReplayError as error:
+            raise ProtocolError("truncated message") from error
+        yield value
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The client side of the arena server (see arena_server.py), for the game
+# loop of sucury.py.
+#
+# The game loop runs one frame at a time and must not block on the
+# network, so the connection lives in a thread of its own, running an
+# asyncio loop. Messages received are queued for the game loop to take on
+# its next frame; turns are handed over to the network thread.
+#
+#    connection = Connection("localhost", 7777)
+#    for kind, payload in connection.received():
+#        ...
+#    connection.send_turn(engine.UP)
+
+import asyncio
+import queue
+import socket
+import threading
+
+import arena
+
+class Connection:
+
+    def __init__(self, host, port, play=True):
+        self.host, self.port = host, port
+        self.play = play
+        self.messages = queue.SimpleQueue()   # (type, payload), then None once closed.
+        self.error = None                     # Why the connection closed, if it failed.
+        self.closed = False
+
+        self.loop = asyncio.new_event_loop()
+        self.writer = None
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.receive(),),
+                                       name="arena", daemon=True)
+        self.thread.start()
+
+    async def receive(self):
+        try:
+            reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            sock = self.writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.writer.write(arena.frame(arena.HELLO, bytes((self.play,))))
+            while True:
+                self.messages.put(await arena.read_message(reader))
+        except (asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass                                      # The server (or close()) ended it.
+        except (OSError, arena.ProtocolError) as error:
+            self.error = error
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+            self.messages.put(None)
+
+    # The messages received since the last call. Once the connection is
+    # closed, 'closed' is set (and 'error' tells why, if it failed).
+
+    def received(self):
+        messages = []
+        while not self.closed:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                self.closed = True
+            else:
+                messages.append(message)
+        return messages
+
+    def send_turn(self, direction):
+        payload = bytes((arena.DIRECTION_CODES[direction],))
+        self.loop.call_soon_threadsafe(self.write, arena.frame(arena.TURN, payload))
+
+    def write(self, data):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(data)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.shutdown)
+            self.thread.join()
+        self.loop.close()
+
+    # In the network thread: end the receiving task.
+
+    def shutdown(self):
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Multiplayer arena server: one shared arena (see arena.py), played by
+# remote clients over TCP.
+#
+#    python3 arena_server.py --port 7777 --size 64 --tick-rate 10
+#    python3 sucury.py --connect localhost:7777
+#
+# A single asyncio loop runs everything: one task per client reads its
+# turns, and the tick task steps the arena at a fixed rate and broadcasts
+# the delta of each tick. The delta is encoded once and the same bytes are
+# written to every client, so a tick costs one encoding plus one buffered
+# write per client. A client whose unsent data piles up beyond MAX_BACKLOG
+# cannot keep up (deltas cannot be skipped) and is disconnected.
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+
+import arena
+import engine
+
+MAX_BACKLOG = 1 << 20     # Unsent bytes a client may fall behind by.
+STATS_INTERVAL = 5        # Seconds between statistics lines (with --stats).
+
+class ArenaServer:
+
+    def __init__(self, board, tick_rate):
+        self.arena = board
+        self.period = 1 / tick_rate
+        self.clients = {}          # Writer -> snake id (None: watching).
+
+        # Statistics since the last report.
+        self.ticks = 0
+        self.busy = 0              # Seconds spent stepping and broadcasting.
+        self.sent = 0              # Bytes queued to clients.
+        self.late = 0              # Ticks started more than a period late.
+        self.dropped = 0           # Clients disconnected for falling behind.
+
+    async def handle_client(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        snake_id = None
+        try:
+            kind, payload = await arena.read_message(reader)
+            if kind != arena.HELLO:
+                raise arena.ProtocolError(f"expected hello, got message type {kind}")
+
+            # Welcome and registration go together (no await in between), so
+            # the client gets every tick after the state it was sent.
+            if payload[:1] == b"\x01":
+                snake_id = self.arena.add_snake()
+            welcome = arena.encode_welcome(self.arena, snake_id, round(self.period * 1e6))
+            writer.write(arena.frame(arena.WELCOME, welcome))
+            self.clients[writer] = snake_id
+
+            while True:
+                kind, payload = await arena.read_message(reader)
+                if kind == arena.TURN and snake_id is not None and payload:
+                    self.arena.steer(snake_id, engine.DIRECTIONS[payload[0] & 3])
+        except (asyncio.IncompleteReadError, ConnectionError, arena.ProtocolError):
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            if snake_id is not None:
+                self.arena.remove_snake(snake_id)
+            writer.close()
+
+    # Step the arena at the tick rate and send each delta to every client.
+    # Ticks are scheduled on a fixed grid (no drift); if the loop falls
+    # more than a tick behind, the grid starts over instead of bursting.
+
+    async def run_ticks(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            deadline += self.period
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif delay < -self.period:
+                deadline = loop.time()
+                self.late += 1
+
+            start = time.perf_counter()
+            message = arena.frame(arena.TICK, arena.encode_delta(self.arena.step()))
+            for writer in list(self.clients):
+                if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                    del self.clients[writer]
+                    writer.close()
+                    self.dropped += 1
+                else:
+                    writer.write(message)
+            self.busy += time.perf_counter() - start
+            self.ticks += 1
+            self.sent += len(message) * len(self.clients)
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            ticks = max(self.ticks, 1)
+            print(f"tick {self.arena.tick}: {len(self.clients)} clients, {len(self.arena.snakes)} snakes, "
+                  f"{self.busy / ticks * 1000:.2f} ms/tick, {self.sent / STATS_INTERVAL / 1024:,.1f} KiB/s sent, "
+                  f"{self.late} late ticks, {self.dropped} dropped clients", flush=True)
+            self.ticks = self.busy = self.sent = self.late = self.dropped = 0
+
+    async def serve(self, host, port, stats=False):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        tasks = [asyncio.create_task(self.run_ticks())]
+        if stats:
+            tasks.append(asyncio.create_task(self.report()))
+        address = server.sockets[0].getsockname()
+        print(f"arena {self.arena.cols}x{self.arena.rows} on {address[0]}:{address[1]}, "
+              f"{1 / self.period:g} ticks/s", flush=True)
+        async with server:
+            await asyncio.gather(server.serve_forever(), *tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a shared Sucury arena.")
+    parser.add_argument("--host", default="localhost", help="address to listen on")
+    parser.add_argument("--port", type=int, default=7777, help="port to listen on")
+    parser.add_argument("--size", type=int, default=64, help="board size, in cells")
+    parser.add_argument("--tick-rate", type=float, default=10, help="moves per second")
+    parser.add_argument("--fruits", type=int, default=arena.FRUITS, help="fruits on the board")
+    parser.add_argument("--seed", type=int, help="seed of the arena")
+    parser.add_argument("--stats", action="store_true", help=f"print statistics every {STATS_INTERVAL} s")
+    args = parser.parse_args()
+
+    if args.size < 2 or args.tick_rate <= 0:
+        parser.error("the board needs 2 cells a side and a positive tick rate")
+
+    server = ArenaServer(arena.Arena(args.size, args.size, args.seed, args.fruits), args.tick_rate)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.stats))
+    except KeyboardInterrupt:
+        pass
+    except OSError as error:
+        sys.exit(f"arena_server: {error}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Game assets (images, fonts, music), loaded in the background.
+#
+# preload() hands the files to a pool of loader threads as early as
+# possible; each one posts an ASSET_LOADED event when it is done, so a scene
+# waiting for input wakes up and can draw it. Getting an asset waits for its
+# file if needed, then finishes it in the main thread: images are converted
+# to the display pixel format (once, so blitting them needs no conversion),
+# fonts are opened. Assets are kept for the lifetime of the process.
+#
+#    ASSETS.preload(("image", "assets/Background.jpg"))
+#    ...
+#    background = ASSETS.image("assets/Background.jpg")
+#
+# Keys are ("image", path), ("font", path, size) and ("data", path), the
+# latter for raw bytes (e.g. music, streamed by the mixer from memory).
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+LOAD_WORKERS = 4    # Loader threads (decoding images releases the GIL).
+
+ASSET_LOADED = pygame.event.custom_type()   # Posted when a file is loaded (event.key).
+
+##
+## Loading, in the loader threads. Nothing here touches the display.
+##
+
+def load_image(path):
+    return pygame.image.load(path)
+
+# Fonts are read here but opened in the main thread (FreeType is not
+# thread-safe).
+
+def load_data(path, size=None):
+    with open(path, "rb") as file:
+        return file.read()
+
+LOADERS = {
+    "image": load_image,
+    "font": load_data,
+    "data": load_data,
+}
+
+##
+## Finishing, in the main thread.
+##
+
+def finish_image(image, path):
+    if pygame.display.get_surface() is None:    # Drawn as textures (see backend.py): any format will do.
+        return image
+    if image.get_flags() & pygame.SRCALPHA:
+        return image.convert_alpha()
+    return image.convert()
+
+def finish_font(data, path, size):
+    return pygame.font.Font(io.BytesIO(data), size)
+
+def finish_data(data, path):
+    return data
+
+FINISHERS = {
+    "image": finish_image,
+    "font": finish_font,
+    "data": finish_data,
+}
+
+class Assets:
+
+    def __init__(self, workers=LOAD_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.loading = {}      # Key -> future of the loaded file.
+        self.cache = {}        # Key -> finished asset.
+
+    # Start loading assets in the background.
+
+    def preload(self, *keys):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="assets")
+        for key in keys:
+            if key not in self.cache and key not in self.loading:
+                future = self.executor.submit(LOADERS[key[0]], *key[1:])
+                future.add_done_callback(lambda future, key=key: notify(key))
+                self.loading[key] = future
+
+    # Whether an asset can be had without waiting.
+
+    def ready(self, key):
+        return key in self.cache or (key in self.loading and self.loading[key].done())
+
+    # The asset, loading it (or waiting for it) if needed. Loading errors
+    # (missing files...) are raised here.
+
+    def get(self, key):
+        asset = self.cache.get(key)
+        if asset is None:
+            self.preload(key)
+            loaded = self.loading.pop(key).result()
+            asset = self.cache[key] = FINISHERS[key[0]](loaded, *key[1:])
+        return asset
+
+    def image(self, path):
+        return self.get(("image", path))
+
+    def font(self, path, size):
+        return self.get(("font", path, size))
+
+    def data(self, path):
+        return self.get(("data", path))
+
+    # Stop the loader threads (files not loaded yet are dropped).
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+# Wake up the main loop. Events can be posted from any thread, but only
+# while the display is up.
+
+def notify(key):
+    try:
+        pygame.event.post(pygame.event.Event(ASSET_LOADED, key=key))
+    except pygame.error:
+        pass
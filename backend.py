@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Drawing through SDL's 2D renderer (pygame._sdl2.video) instead of the
+# display surface.
+#
+# By default, the game blits everything onto the surface returned by
+# pygame.display.set_mode(), with the CPU, and the changed areas are then
+# copied to the window. A TextureBackend draws into a window of its own
+# through a Renderer: images are kept as textures (in video memory, if
+# there is a GPU), and a frame is a series of texture copies, scaled as
+# needed, and rectangle fills, composed by the renderer and shown at once.
+#
+#    backend = TextureBackend("Sucury", (650, 650))
+#    backend.fill(color)                          # clear the frame
+#    backend.blit(text, (x, y))                   # an image that never changes
+#    backend.draw(backend.stream("cells", cells), rect)   # one that does
+#    backend.present()
+#
+# blit() and fill() take the arguments of Surface.blit() and Surface.fill(),
+# so code drawing on a surface can draw through a backend as well. A surface
+# blitted must not change afterwards (text, images...): its texture is made
+# on the first blit and kept as long as the surface lives. A surface that is
+# drawn over goes through stream() instead, which copies it into a texture
+# kept under a name.
+#
+# When no accelerated renderer can be made (no GPU, the SDL dummy driver),
+# or when asked to, the backend uses SDL's software renderer.
+
+import weakref
+
+import pygame
+from pygame._sdl2 import video
+
+RENDERER_ERRORS = (pygame.error, video.error)
+
+BLENDMODE_NONE = 0           # SDL blend modes: plain copy,
+BLENDMODE_BLEND = 1          # alpha blending (much slower in software).
+
+class TextureBackend:
+
+    def __init__(self, title, size, accelerated=True):
+        self.window = video.Window(title, size)
+        self.size = size
+
+        self.renderer = None
+        if accelerated:
+            try:
+                self.renderer = video.Renderer(self.window, accelerated=1)
+            except RENDERER_ERRORS:
+                pass
+        self.accelerated = self.renderer is not None
+        if self.renderer is None:
+            self.renderer = video.Renderer(self.window, accelerated=0)
+
+        self.textures = weakref.WeakKeyDictionary()   # Surface -> its texture.
+        self.streams = {}                             # Name -> streaming texture.
+        self.discs = {}                               # Radius -> white disc.
+
+    def set_caption(self, title):
+        self.window.title = title
+
+    # The texture of a surface that does not change.
+
+    def texture(self, surface):
+        texture = self.textures.get(surface)
+        if texture is None:
+            texture = self.textures[surface] = video.Texture.from_surface(self.renderer, surface)
+        return texture
+
+    # Copy the pixels of a surface into the texture called name, and return
+    # it. The texture is made once (again if the size changes), and blends
+    # only if the surface has per-pixel alpha.
+
+    def stream(self, name, surface):
+        size = surface.get_size()
+        texture = self.streams.get(name)
+        if texture is None or (texture.width, texture.height) != size:
+            texture = video.Texture(self.renderer, size, depth=32, streaming=True)
+            self.streams[name] = texture
+        texture.blend_mode = BLENDMODE_BLEND if surface.get_flags() & pygame.SRCALPHA else BLENDMODE_NONE
+        texture.update(surface)
+        return texture
+
+    ##
+    ## Drawing (in the frame being composed).
+    ##
+
+    # As Surface.blit(): dest is a position, or a rect whose top left is used.
+
+    def blit(self, surface, dest, area=None):
+        width, height = area[2:] if area else surface.get_size()
+        rect = pygame.Rect(dest[0], dest[1], width, height)
+        self.texture(surface).draw(srcrect=area, dstrect=rect)
+        return rect
+
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = pygame.Color(color)
+        if rect is None:
+            self.renderer.clear()
+            return pygame.Rect((0, 0), self.size)
+        self.renderer.fill_rect(rect)
+        return pygame.Rect(rect)
+
+    # Draw a texture, scaled to fill rect.
+
+    def draw(self, texture, rect):
+        texture.draw(dstrect=rect)
+
+    # A filled circle: one white disc per radius, tinted when drawn.
+
+    def circle(self, color, center, radius):
+        disc = self.discs.get(radius)
+        if disc is None:
+            image = pygame.Surface((2*radius, 2*radius), pygame.SRCALPHA)
+            pygame.draw.circle(image, "white", (radius, radius), radius)
+            disc = self.discs[radius] = video.Texture.from_surface(self.renderer, image)
+        disc.color = pygame.Color(color)
+        disc.draw(dstrect=(round(center[0]) - radius, round(center[1]) - radius, 2*radius, 2*radius))
+
+    # Show the frame. What was drawn is lost: the next frame starts over.
+
+    def present(self):
+        self.renderer.present()
+
+    # Copy the frame being composed (not presented yet) into a surface of
+    # the window size.
+
+    def read_back(self, surface):
+        self.renderer.to_surface(surface)
+
+    def close(self):
+        self.textures.clear()
+        self.streams.clear()
+        self.discs.clear()
+        self.renderer = None
+        self.window.destroy()
@@ -0,0 +1,305 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Many games stepped at once, with NumPy.
+#
+# BatchedGames holds N games of the same board size as arrays (one row per
+# game) laid out like engine.GameState: packed cells, a ring buffer for the
+# body and an occupancy grid. step() applies one move to every game with a
+# handful of array operations and respawns the games that ended, the same
+# way the interactive game does. The rules are those of engine.py; run
+#
+#    python3 batch.py --check
+#
+# to compare both, move by move, on random and autopilot games (on the given
+# board size, then on a 3x3 board, where games are won).
+#
+#    games = BatchedGames(4096, 13, 13, seed=0)
+#    events = games.step(actions)     # actions: direction codes, or KEEP
+
+import argparse
+import random
+import sys
+
+import numpy as np
+
+import autopilot
+import engine
+
+KEEP = -1     # Action: keep going the same way.
+
+WIN_CHECK_SIZE = 3     # Board of the second check, small enough to be filled.
+
+# Direction codes are indices into engine.DIRECTIONS (UP, DOWN, LEFT, RIGHT).
+
+DIRECTION_CODES = {direction: code for code, direction in enumerate(engine.DIRECTIONS)}
+DX = np.array([xmov for xmov, ymov in engine.DIRECTIONS], dtype=np.int32)
+DY = np.array([ymov for xmov, ymov in engine.DIRECTIONS], dtype=np.int32)
+
+class BatchedGames:
+
+    def __init__(self, n, cols, rows, seed=None):
+        self.n, self.cols, self.rows = n, cols, rows
+        self.cells = cells = cols * rows
+        self.rng = np.random.default_rng(seed)
+
+        self.ring = np.zeros((n, cells), dtype=np.int32)       # Body ring buffers.
+        self.head_slot = np.zeros(n, dtype=np.int32)
+        self.length = np.zeros(n, dtype=np.int32)              # Head included.
+        self.head = np.zeros(n, dtype=np.int32)
+        self.direction = np.zeros(n, dtype=np.int8)
+        self.growth = np.zeros(n, dtype=np.int32)
+        self.occupied = np.zeros((n, cells), dtype=np.uint8)   # Occupancy grids.
+        self.fruit = np.zeros(n, dtype=np.int32)
+        self.fruit_type = np.zeros(n, dtype=np.int8)
+        self.speed = np.zeros(n, dtype=np.int8)
+        self.tick = np.zeros(n, dtype=np.int64)
+
+        self.reset(np.arange(n))
+
+    @property
+    def score(self):
+        return self.length - 1
+
+    # Start new games in the given rows.
+
+    def reset(self, index):
+        k = len(index)
+        if not k:
+            return
+        cols, rows = self.cols, self.rows
+
+        # Random start position, away from the borders (as engine.reset()).
+
+        pad_x = min(engine.START_POS_PADDING, (cols - 1) // 2)
+        pad_y = min(engine.START_POS_PADDING, (rows - 1) // 2)
+        x = self.rng.integers(pad_x, cols - pad_x, size=k, dtype=np.int32)
+        y = self.rng.integers(pad_y, rows - pad_y, size=k, dtype=np.int32)
+        head = y*cols + x
+
+        self.occupied[index] = 0
+        self.occupied[index, head] = 1
+        self.ring[index, 0] = head
+        self.head[index] = head
+        self.head_slot[index] = 0
+        self.length[index] = 1
+        self.direction[index] = np.where(x > cols / 2, DIRECTION_CODES[engine.LEFT], DIRECTION_CODES[engine.RIGHT])
+        self.growth[index] = 0
+        self.speed[index] = engine.START_SPEED
+        self.tick[index] = 0
+
+        self.spawn_fruit(index)
+
+    # Drop a fruit onto a random free cell of each given game. Returns a
+    # mask of the games with no free cell left.
+
+    def spawn_fruit(self, index):
+        noise = self.rng.random((len(index), self.cells))
+        noise[self.occupied[index] == 1] = -1
+        cell = noise.argmax(axis=1)
+        full = noise[np.arange(len(index)), cell] < 0
+        self.fruit[index] = cell
+        self.fruit_type[index] = self.rng.integers(0, engine.FRUIT_TYPES, size=len(index))
+        return full
+
+    # Advance every game by one move. Returns the engine event of each game
+    # (NOTHING, ATE, WALL, BITE or WIN); the games that ended start over.
+
+    def step(self, actions=None):
+        n, cols, cap = self.n, self.cols, self.cells
+        games = np.arange(n)
+        events = np.full(n, engine.NOTHING, dtype=np.int8)
+
+        if actions is not None:
+            actions = np.asarray(actions)
+            self.direction = np.where(actions >= 0, actions, self.direction).astype(np.int8)
+        self.tick += 1
+
+        # Check for border crash.
+
+        y, x = np.divmod(self.head, cols)
+        x = x + DX[self.direction]
+        y = y + DY[self.direction]
+        wall = (x < 0) | (y < 0) | (x >= cols) | (y >= self.rows)
+        events[wall] = engine.WALL
+        moving = ~wall
+
+        # Grow, or free the last tail segment.
+
+        growing = moving & (self.growth > 0)
+        shrinking = moving & ~growing
+        tail = self.ring[games, (self.head_slot - self.length + 1) % cap]
+        self.occupied[games[shrinking], tail[shrinking]] = 0
+        self.growth -= growing
+        self.length += growing
+
+        # Move the head.
+
+        head = np.where(moving, y*cols + x, self.head)
+        self.head_slot = np.where(moving, (self.head_slot + 1) % cap, self.head_slot)
+        self.ring[games[moving], self.head_slot[moving]] = head[moving]
+        self.head = head
+
+        # Check for self-bite.
+
+        bite = moving & (self.occupied[games, head] == 1)
+        events[bite] = engine.BITE
+        alive = moving & ~bite
+        self.occupied[games[alive], head[alive]] = 1
+
+        # Eat fruit.
+
+        ate = alive & (head == self.fruit)
+        kind = self.fruit_type
+        self.growth += ate.astype(np.int32) + (ate & (kind == engine.ORANGE))
+        self.speed = np.where(ate & (kind == engine.PEAR), np.minimum(self.speed + 1, engine.MAX_SPEED), self.speed).astype(np.int8)
+        self.speed = np.where(ate & (kind == engine.BLUEBERRY), np.maximum(self.speed - 1, engine.MIN_SPEED), self.speed).astype(np.int8)
+        events[ate] = engine.ATE
+
+        eaters = games[ate]
+        if len(eaters):
+            full = self.spawn_fruit(eaters)
+            events[eaters[full]] = engine.WIN
+
+        # Respawn the games that ended.
+
+        self.reset(games[(events == engine.WALL) | (events == engine.BITE) | (events == engine.WIN)])
+        return events
+
+    # Copy an engine game into row i (e.g. to continue it here).
+
+    def load(self, i, game):
+        body = [game.head] + game.body
+        self.ring[i] = 0
+        self.ring[i, :len(body)] = body[::-1]   # Tail end first, head last.
+        self.head_slot[i] = len(body) - 1
+        self.length[i] = len(body)
+        self.head[i] = game.head
+        self.direction[i] = DIRECTION_CODES[game.direction]
+        self.growth[i] = game.growth
+        self.occupied[i] = np.frombuffer(game.occupied, dtype=np.uint8)
+        self.fruit[i] = game.fruit if game.fruit is not None else 0
+        self.fruit_type[i] = game.fruit_type
+        self.speed[i] = game.speed
+        self.tick[i] = game.tick
+
+    # Tail cells of game i, nearest to the head first (as GameState.body).
+
+    def body(self, i):
+        slots = (self.head_slot[i] - np.arange(1, self.length[i])) % self.cells
+        return self.ring[i, slots].tolist()
+
+##
+## Differential check against the engine.
+##
+
+# Step engine games and their batched copies side by side, comparing every
+# move. Half the games are played by the autopilot, so that small boards
+# are won too; the others take random actions. Fruit placement is random in
+# both, so the batch takes the engine's fruit whenever a new one drops. Games
+# that end respawn by themselves in the batch; the engine game is reset too,
+# then its snake and fruit are moved to the cells the batch drew.
+
+def check(n=64, cols=8, rows=8, moves=5000, seed=0):
+    rng = random.Random(seed)
+    games = [engine.new_game(cols, rows, seed=rng.getrandbits(32)) for _ in range(n)]
+    pilots = [autopilot.Autopilot(game) if i % 2 == 0 else None for i, game in enumerate(games)]
+    batch = BatchedGames(n, cols, rows, seed=seed)
+    for i, game in enumerate(games):
+        batch.load(i, game)
+    ends = dict.fromkeys(engine.DEATHS + (engine.WIN,), 0)
+
+    for move in range(moves):
+        actions = []
+        for game, pilot in zip(games, pilots):
+            if pilot is not None:
+                direction = pilot(game)
+                actions.append(DIRECTION_CODES[direction] if direction is not None else KEEP)
+            else:
+                actions.append(rng.randrange(len(engine.DIRECTIONS)) if rng.random() < 0.3 else KEEP)
+        events = batch.step(actions)
+
+        for i, game in enumerate(games):
+            action = engine.DIRECTIONS[actions[i]] if actions[i] != KEEP else None
+            game, event = engine.step(game, action)
+
+            if event != events[i]:
+                return f"move {move}, game {i}: engine event {event}, batch event {events[i]}", ends
+
+            if event in ends:
+                ends[event] += 1
+                engine.reset(game)
+                if not start_cell(game, batch.head[i]):
+                    return f"move {move}, game {i}: batch respawned on cell {batch.head[i]}", ends
+                if batch.fruit[i] == batch.head[i] or not 0 <= batch.fruit_type[i] < engine.FRUIT_TYPES:
+                    return f"move {move}, game {i}: batch respawned with a bad fruit", ends
+                align(game, int(batch.head[i]), int(batch.fruit[i]), int(batch.fruit_type[i]))
+                if pilots[i] is not None:
+                    pilots[i] = autopilot.Autopilot(game)
+            elif event == engine.ATE:
+                batch.fruit[i], batch.fruit_type[i] = game.fruit, game.fruit_type
+
+            if (batch.head[i] != game.head or batch.body(i) != game.body
+                    or batch.direction[i] != DIRECTION_CODES[game.direction]
+                    or batch.growth[i] != game.growth or batch.speed[i] != game.speed
+                    or batch.fruit[i] != game.fruit or batch.fruit_type[i] != game.fruit_type
+                    or batch.tick[i] != game.tick or bytes(batch.occupied[i]) != bytes(game.occupied)):
+                return f"move {move}, game {i}: states differ", ends
+    return None, ends
+
+# Whether engine.reset() could have started the snake on a cell.
+
+def start_cell(game, cell):
+    pad_x = min(engine.START_POS_PADDING, (game.cols - 1) // 2)
+    pad_y = min(engine.START_POS_PADDING, (game.rows - 1) // 2)
+    y, x = divmod(int(cell), game.cols)
+    return pad_x <= x < game.cols - pad_x and pad_y <= y < game.rows - pad_y
+
+# Move the one-cell snake of a new engine game, and its fruit, to other
+# cells, heading as engine.reset() would from there.
+
+def align(game, head, fruit, fruit_type):
+    engine.release(game, game.head)
+    game.head = game.ring[game.head_slot] = head
+    engine.occupy(game, head)
+    x = head % game.cols
+    game.direction = engine.LEFT if x > game.cols / 2 else engine.RIGHT
+    game.fruit, game.fruit_type = fruit, fruit_type
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched Sucury games.")
+    parser.add_argument("--check", action="store_true", help="compare the batched rules with engine.py")
+    parser.add_argument("--games", type=int, default=64)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--moves", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.check:
+        for size in (args.size, WIN_CHECK_SIZE):
+            error, ends = check(args.games, size, size, args.moves, args.seed)
+            if error:
+                sys.exit(f"batched rules differ from the engine: {error}")
+            if size == WIN_CHECK_SIZE and not ends[engine.WIN]:
+                sys.exit(f"no game won on a {size}x{size} board: the win path was not checked")
+            print(f"{args.games} games x {args.moves} moves on {size}x{size}: batched rules match the engine"
+                  f" ({ends[engine.WALL]} wall, {ends[engine.BITE]} bite, {ends[engine.WIN]} win)")
+
+if __name__ == "__main__":
+    main()
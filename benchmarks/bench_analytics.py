@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure the event log (see analytics.py): the cost of an event for the
+# game loop, and the throughput of the offline aggregation.
+#
+#    python3 benchmarks/bench_analytics.py [--sessions 2000] [--dir DIR]
+#
+# Sessions of headless games (played by the greedy policy, with the events
+# sucury.py sends) are logged to DIR (a temporary directory by default),
+# then the logs are aggregated.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+import engine
+import policies
+
+CAUSES = {engine.WALL: "wall", engine.BITE: "bite"}
+
+def play_session(bus, rng, games):
+    session = f"{rng.getrandbits(64):016x}"
+    emit = lambda kind, **fields: bus.emit(kind, session=session, **fields)
+    emit("session_start")
+    best = 0
+    for _ in range(games):
+        game = engine.new_game(13, 13, seed=rng.getrandbits(32))
+        policy = policies.greedy(game)
+        emit("game_start", mode="play", cols=game.cols, rows=game.rows)
+        event = engine.NOTHING
+        while game.alive:
+            speed = game.speed
+            game, event = engine.step(game, policy(game))
+            if event in (engine.ATE, engine.WIN):
+                emit("fruit", fruit=analytics.FRUIT_NAMES[game.eaten], score=game.score, tick=game.tick)
+                if game.speed != speed:
+                    emit("speed", speed=game.speed, previous=speed)
+            if rng.random() < 0.002:
+                emit("pause", paused=True)
+                emit("pause", paused=False)
+        if event == engine.WIN:
+            emit("win", score=game.score, tick=game.tick)
+        else:
+            emit("death", cause=CAUSES[event], score=game.score, tick=game.tick)
+        if game.score > best:
+            best = game.score
+            emit("best_score", score=best)
+    emit("session_end", best=best, games=games, seconds=rng.randint(30, 3600))
+
+# The listener's share of the work: time spent in EventLog.__call__.
+
+class Timed:
+
+    def __init__(self, listener):
+        self.listener = listener
+        self.calls = 0
+        self.seconds = 0
+
+    def __call__(self, event):
+        start = time.perf_counter()
+        self.listener(event)
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Sucury event log and aggregation.")
+    parser.add_argument("--sessions", type=int, default=2000, help="sessions to log")
+    parser.add_argument("--games", type=int, default=5, help="games per session")
+    parser.add_argument("--dir", help="log directory (default: a temporary one)")
+    parser.add_argument("--rotate", type=int, default=analytics.ROTATE_BYTES, help="log file size limit, in bytes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.dir or scratch
+        rng = random.Random(0)
+        bus = analytics.EventBus()
+        log = analytics.EventLog(directory, rotate_bytes=args.rotate)
+        timed = Timed(log)
+        bus.listen(timed)
+
+        start = time.perf_counter()
+        for _ in range(args.sessions):
+            play_session(bus, rng, args.games)
+        played = time.perf_counter() - start
+        log.close()
+        written = time.perf_counter() - start
+
+        files = analytics.log_files([directory])
+        size = sum(os.path.getsize(path) for path in files)
+        print(f"{args.sessions} sessions: {timed.calls:,} events, {len(files)} files, {size / 2**20:.1f} MiB")
+        print(f"game loop: {timed.seconds / timed.calls * 1e6:.2f} us/event in the log "
+              f"({played:.2f} s played, {written - played:.2f} s left to write at exit)")
+
+        start = time.perf_counter()
+        total = analytics.Summary()
+        for path in files:
+            total.merge(analytics.summarize_file(path))
+        elapsed = time.perf_counter() - start
+        print(f"aggregation (one process): {total.events / elapsed:,.0f} events/s, "
+              f"{args.sessions / elapsed:,.0f} sessions/s")
+        if total.events != timed.calls or total.sessions != args.sessions or total.bad_lines:
+            sys.exit("aggregation lost events")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Load generator for the arena server (arena_server.py).
+#
+#    python3 benchmarks/bench_arena.py --clients 200 --seconds 20 [--json results.json]
+#
+# Starts a server on a loopback port (or uses --connect HOST:PORT) and
+# connects many bot clients to it from one asyncio loop. Each bot mirrors
+# the arena from the deltas (so the protocol is checked on every tick: a
+# desynchronized mirror is an error) and steers its snake away from walls
+# and snakes. Reports, per client, the bandwidth received and the tick
+# jitter: how far apart consecutive ticks arrive, compared with the tick
+# period.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import arena
+import engine
+
+TURN_CHANCE = 0.2     # How often a bot turns when it does not have to.
+
+class Bot:
+
+    def __init__(self, rng, play):
+        self.rng = rng
+        self.play = play
+        self.view = None
+        self.direction = None
+        self.received = 0          # Bytes.
+        self.ticks = 0
+        self.intervals = []        # Seconds between consecutive ticks.
+        self.last = None
+
+    async def run(self, host, port, until):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(arena.frame(arena.HELLO, bytes((self.play,))))
+        loop = asyncio.get_running_loop()
+        try:
+            while loop.time() < until:
+                try:
+                    kind, payload = await asyncio.wait_for(arena.read_message(reader), until - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                now = loop.time()
+                self.received += arena.FRAME.size + len(payload)
+                if kind == arena.WELCOME:
+                    self.view = arena.View(payload)
+                elif kind == arena.TICK:
+                    self.view.apply(payload)
+                    self.ticks += 1
+                    if self.last is not None:
+                        self.intervals.append(now - self.last)
+                    self.last = now
+                    if self.play:
+                        direction = self.steer()
+                        if direction is not None:
+                            writer.write(arena.frame(arena.TURN, bytes((arena.DIRECTION_CODES[direction],))))
+        finally:
+            writer.close()
+
+    # Keep going if the way is clear (now and then turning anyway), else
+    # take any free cell around the head.
+
+    def steer(self):
+        view = self.view
+        body = view.snakes.get(view.player)
+        if not body:
+            self.direction = None
+            return None
+        if self.direction is None and len(body) == 1:
+            x = body[-1] % view.cols
+            self.direction = engine.LEFT if x > view.cols / 2 else engine.RIGHT   # As the server spawns it.
+
+        y, x = divmod(body[-1], view.cols)
+        free = []
+        for direction in engine.DIRECTIONS:
+            nx, ny = x + direction[0], y + direction[1]
+            if 0 <= nx < view.cols and 0 <= ny < view.rows and not view.occupant[ny*view.cols + nx]:
+                free.append(direction)
+        if not free:
+            return None
+        if self.direction in free and self.rng.random() > TURN_CHANCE:
+            return None
+        self.direction = self.rng.choice(free)
+        return self.direction
+
+def percentiles(values):
+    ordered = sorted(values)
+    count = len(ordered)
+    if not count:
+        return {}
+    pick = lambda fraction: ordered[min(int(fraction * count), count - 1)]
+    return {"mean": sum(ordered) / count, "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+async def load(host, port, clients, watchers, seconds, seed):
+    rng = random.Random(seed)
+    bots = [Bot(random.Random(rng.random()), True) for _ in range(clients)]
+    bots += [Bot(random.Random(rng.random()), False) for _ in range(watchers)]
+    until = asyncio.get_running_loop().time() + seconds
+    await asyncio.gather(*(bot.run(host, port, until) for bot in bots))
+    return bots
+
+# Start a server in its own process, and wait for it to listen.
+
+def spawn_server(port, size, tick_rate):
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "arena_server.py"), "--host", "127.0.0.1",
+                               "--port", str(port), "--size", str(size), "--tick-rate", str(tick_rate), "--stats"])
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    sys.exit("bench_arena: the server did not start")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Sucury arena server.")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="use this server instead of starting one")
+    parser.add_argument("--clients", type=int, default=100, help="playing clients")
+    parser.add_argument("--watchers", type=int, default=0, help="watching clients")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of the test")
+    parser.add_argument("--size", type=int, default=128, help="board size of the started server")
+    parser.add_argument("--tick-rate", type=float, default=10, help="tick rate of the started server")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the bots")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    server = None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        port = int(port)
+    else:
+        host, port = "127.0.0.1", free_port()
+        server = spawn_server(port, args.size, args.tick_rate)
+
+    try:
+        bots = asyncio.run(load(host, port, args.clients, args.watchers, args.seconds, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    period = bots[0].view.period_us / 1e6
+    jitter = [abs(interval - period) * 1000 for bot in bots for interval in bot.intervals]
+    bandwidth = [bot.received / args.seconds for bot in bots]
+    ticks = [bot.ticks for bot in bots]
+
+    report = {
+        "clients": args.clients,
+        "watchers": args.watchers,
+        "seconds": args.seconds,
+        "board": [bots[0].view.cols, bots[0].view.rows],
+        "tick_period_ms": period * 1000,
+        "ticks_per_client": percentiles(ticks),
+        "jitter_ms": percentiles(jitter),
+        "bytes_per_second_per_client": percentiles(bandwidth),
+        "bytes_per_tick": sum(bot.received for bot in bots) / max(sum(ticks), 1),
+    }
+
+    print(f"{args.clients} clients + {args.watchers} watchers, {args.seconds:g} s, "
+          f"board {report['board'][0]}x{report['board'][1]}, tick {period * 1000:g} ms")
+    print(f"ticks per client   min {min(ticks)}  max {max(ticks)}")
+    print("jitter (ms)        " + "  ".join(f"{key} {value:.2f}" for key, value in report["jitter_ms"].items()))
+    print("bandwidth (B/s)    " + "  ".join(f"{key} {value:,.0f}" for key, value in report["bytes_per_second_per_client"].items()))
+    print(f"bytes per tick     {report['bytes_per_tick']:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
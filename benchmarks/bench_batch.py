@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure how many game moves per second the batched (NumPy) engine makes.
+#
+#    python3 benchmarks/bench_batch.py [--games N] [--moves M] [--size COLS]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch
+import engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched game engine.")
+    parser.add_argument("--games", type=int, default=4096, help="games stepped at once")
+    parser.add_argument("--moves", type=int, default=1000, help="moves per game")
+    parser.add_argument("--size", type=int, default=13, help="board size, in cells")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    games = batch.BatchedGames(args.games, args.size, args.size, seed=args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    # Random turns now and then (the same cheap policy as bench_engine.py).
+    actions = np.where(rng.random((args.moves, args.games)) < 0.2,
+                       rng.integers(0, 4, (args.moves, args.games)), batch.KEEP)
+
+    deaths = fruits = 0
+    start = time.perf_counter()
+    for move in range(args.moves):
+        events = games.step(actions[move])
+        fruits += np.count_nonzero(events == engine.ATE)
+        deaths += np.count_nonzero((events == engine.WALL) | (events == engine.BITE))
+    elapsed = time.perf_counter() - start
+
+    total = args.games * args.moves
+    print(f"games:     {args.games}")
+    print(f"moves:     {total}")
+    print(f"board:     {args.size}x{args.size}")
+    print(f"fruits:    {fruits}")
+    print(f"deaths:    {deaths}")
+    print(f"elapsed:   {elapsed:.3f} s")
+    print(f"moves/sec: {total / elapsed:,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure how fast game states can be cloned and (de)serialized, for snakes
+# of several lengths.
+#
+#    python3 benchmarks/bench_clone.py [--lengths 10 1000 10000] [--seconds S]
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+
+# A game whose snake has the given length, laid out in a zigzag on a square
+# board about twice as large.
+
+def long_game(length, seed=0):
+    size = math.isqrt(2 * length) + 2
+    game = engine.new_game(size, size, seed=seed)
+    engine.release(game, game.head)
+
+    path = [y*size + (x if y % 2 == 0 else size - 1 - x) for y in range(size) for x in range(size)]
+    for slot, cell in enumerate(path[:length]):
+        game.ring[slot] = cell
+        engine.occupy(game, cell)
+    game.head_slot = length - 1
+    game.length = length
+    game.head = path[length - 1]
+    game.direction = engine.RIGHT if (length - 1) // size % 2 == 0 else engine.LEFT
+    engine.spawn_fruit(game)
+    return game
+
+# Calls per second of function(game), run for about 'seconds'.
+
+def rate(function, game, seconds):
+    calls, start = 0, time.perf_counter()
+    while True:
+        for _ in range(100):
+            function(game)
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark game state cloning and snapshots.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 1000, 10000], help="snake lengths")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent on each measure")
+    args = parser.parse_args()
+
+    print(f"{'length':>8}{'board':>10}{'bytes':>9}{'clone/s':>12}{'to_bytes/s':>12}{'from_bytes/s':>14}")
+    for length in args.lengths:
+        game = long_game(length)
+        data = engine.to_bytes(game)
+        clones = rate(engine.clone, game, args.seconds)
+        dumps = rate(engine.to_bytes, game, args.seconds)
+        loads = rate(engine.from_bytes, data, args.seconds)
+        print(f"{length:>8}{f'{game.cols}x{game.rows}':>10}{len(data):>9}"
+              f"{clones:>12,.0f}{dumps:>12,.0f}{loads:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
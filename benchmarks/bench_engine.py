@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure how many engine steps per second can be simulated headlessly.
+#
+#    python3 benchmarks/bench_engine.py [--steps N] [--size COLS] [--seed S]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the headless game engine.")
+    parser.add_argument("--steps", type=int, default=1_000_000, help="number of steps to simulate")
+    parser.add_argument("--size", type=int, default=13, help="board size, in cells")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    # A cheap policy: go toward the fruit, turning at random now and then.
+
+    rng = random.Random(args.seed)
+    game = engine.new_game(args.size, args.size, seed=args.seed)
+    step, reset = engine.step, engine.reset
+    deaths = fruits = 0
+
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        action = None
+        if rng.random() < 0.2:
+            hx, hy = engine.cell_xy(game, game.head)
+            fx, fy = engine.cell_xy(game, game.fruit)
+            if fx != hx:
+                action = engine.RIGHT if fx > hx else engine.LEFT
+            else:
+                action = engine.DOWN if fy > hy else engine.UP
+        game, event = step(game, action)
+        if event == engine.ATE:
+            fruits += 1
+        elif event in engine.DEATHS:
+            deaths += 1
+            reset(game)
+    elapsed = time.perf_counter() - start
+
+    print(f"steps:     {args.steps}")
+    print(f"board:     {args.size}x{args.size}")
+    print(f"fruits:    {fruits}")
+    print(f"deaths:    {deaths}")
+    print(f"elapsed:   {elapsed:.3f} s")
+    print(f"steps/sec: {args.steps / elapsed:,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure the cost of board observations (see observation.py) for snakes of
+# several lengths: the incremental update after a move (single and stacked
+# frames), a full rebuild from the occupancy grid, and, for comparison,
+# building the board in Python from the body cells.
+#
+#    python3 benchmarks/bench_observation.py [--lengths 10 1000 10000] [--seconds S]
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import observation
+from bench_clone import long_game, rate
+
+# An update right after a move (the cells it touches are painted whatever
+# changed, so only the tick needs to move on).
+
+def incremental(observer):
+    observer.game.tick += 1
+    observer.update()
+
+def rebuild(observer):
+    observer.rebuild(observer.buffer[0])
+
+# The board built from scratch, one body cell at a time.
+
+def from_body(game):
+    board = np.zeros((observation.CHANNELS, game.rows + 2, game.cols + 2), dtype=np.uint8)
+    for cell in game.body:
+        y, x = divmod(cell, game.cols)
+        board[observation.BODY, y + 1, x + 1] = 1
+    y, x = divmod(game.head, game.cols)
+    board[observation.HEAD, y + 1, x + 1] = 1
+    return board
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark board observations.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 1000, 10000], help="snake lengths")
+    parser.add_argument("--frames", type=int, default=4, help="frames stacked in the second measure")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent on each measure")
+    args = parser.parse_args()
+
+    print(f"{'length':>8}{'board':>10}{'update/s':>12}{f'stack{args.frames}/s':>12}{'rebuild/s':>12}{'python/s':>12}")
+    for length in args.lengths:
+        game = long_game(length)
+        single = rate(incremental, observation.Observer(game), args.seconds)
+        stacked = rate(incremental, observation.Observer(game, args.frames), args.seconds)
+        rebuilds = rate(rebuild, observation.Observer(game), args.seconds)
+        python = rate(from_body, game, args.seconds)
+        print(f"{length:>8}{f'{game.cols}x{game.rows}':>10}{single:>12,.0f}{stacked:>12,.0f}"
+              f"{rebuilds:>12,.0f}{python:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
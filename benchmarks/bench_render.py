@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure the rendering path of the game, headless (SDL dummy drivers).
+#
+#    python3 benchmarks/bench_render.py [--json results.json] [--compare baseline.json]
+#    python3 benchmarks/bench_render.py --backends surface software
+#
+# For each backend, grid size, window size and snake length, the real play
+# scene of sucury.py runs for a number of frames, with the snake going round a
+# Hamiltonian cycle of the board (so it keeps its length and never dies) and
+# one move per frame. Frames are drawn in three modes:
+#
+#    play        the normal frames (only the changed cells are drawn again)
+#    full        every frame drawn whole
+#    color_menu  the color menu open over the (paused) game
+#
+# Backends (see sucury.BACKENDS): surface, the blits onto the display
+# surface (the default), and software or texture, the SDL renderer (see
+# backend.py; headless, texture falls back to software).
+#
+# The frame-rate cap is lifted, so the frames per second measure the work
+# done. Each drawing function is also timed on its own. With --compare, the
+# frame rates are checked against a previous run, and the exit status is 1
+# if any got slower by more than the tolerance.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)     # sucury.py loads its assets from relative paths.
+
+import pygame
+
+import autopilot
+import engine
+import sucury
+
+MODES = ("play", "full", "color_menu")
+
+# A clock that never sleeps and reports one move worth of time per frame.
+
+class MoveClock:
+
+    def __init__(self, game):
+        self.game = game
+
+    def tick(self, framerate=0):
+        return 1000 / self.game.speed
+
+# Lay a snake of the given length along the Hamiltonian cycle of the board
+# and return a policy that keeps it on the cycle. Returns None if the snake
+# does not fit (there must be at least one free cell).
+
+def lay_snake(game, length):
+    order = autopilot.cycle(game.cols, game.rows)
+    if order is None:
+        return None
+    path = sorted((position, cell) for cell, position in enumerate(order) if position % 2 == 0)
+    path = [cell for position, cell in path]
+    if length >= len(path):
+        return None
+
+    for cell in [game.head] + game.body:
+        if game.occupied[cell]:
+            engine.release(game, cell)
+    for slot, cell in enumerate(path[:length]):
+        game.ring[slot] = cell
+        engine.occupy(game, cell)
+    game.head_slot = length - 1
+    game.length = length
+    game.head = path[length - 1]
+    game.growth = 0
+    game.fruit = None      # Nothing to eat: the length stays the same.
+    game.queue.clear()
+
+    # The direction from each cell to the next one on the cycle.
+
+    turns = {}
+    for cell, following in zip(path, path[1:] + path[:1]):
+        (x, y), (next_x, next_y) = engine.cell_xy(game, cell), engine.cell_xy(game, following)
+        turns[cell] = (next_x - x, next_y - y)
+    game.direction = turns[path[length - 2]] if length > 1 else turns[game.head]
+    return lambda game: turns[game.head]
+
+def percentiles(durations):
+    ordered = sorted(durations)
+    count = len(ordered)
+    pick = lambda fraction: ordered[min(int(fraction * count), count - 1)] / 1e6
+    return {"mean": sum(ordered) / count / 1e6, "p50": pick(0.5), "p95": pick(0.95),
+            "p99": pick(0.99), "max": ordered[-1] / 1e6}
+
+# Time calls of function(), in ns.
+
+def time_calls(function, calls):
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter_ns()
+        function()
+        durations.append(time.perf_counter_ns() - start)
+    return durations
+
+# Run one configuration. Returns its results, or None if the snake does not
+# fit on the board.
+
+def run_config(backend, mode, grid_size, width, height, length, frames, warmup):
+    sucury.GRID_SIZE = grid_size
+    sucury.WIDTH, sucury.HEIGHT = width, height
+    sucury.open_display(backend)
+    sucury.RECORD_REPLAYS = False
+
+    scene = sucury.PlayScene()
+    policy = lay_snake(scene.game, length)
+    if policy is None:
+        return None
+    scene.pilot = policy
+    sucury.clock = MoveClock(scene.game)
+    scene.enter()
+    if mode == "color_menu":
+        scene.show_color_menu, scene.game_on = True, False
+
+    durations = []
+    for i in range(warmup + frames):
+        if mode == "full":
+            scene.full_redraw = True
+        start = time.perf_counter_ns()
+        next_scene = scene.frame()
+        if i >= warmup:
+            durations.append(time.perf_counter_ns() - start)
+        if next_scene is not scene:
+            raise RuntimeError(f"the benchmark game ended ({type(next_scene).__name__})")
+
+    # The drawing functions, on their own.
+
+    snake, game = scene.snake, scene.game
+    functions = {
+        "draw_grid": lambda: sucury.draw_grid(),
+        "score_blit": lambda: sucury.CANVAS.blit(
+            sucury.textcache.render(sucury.BIG_FONT, f"{game.score}", True, sucury.SCORE_COLOR), (0, 0)),
+        "color_picker_draw": lambda: scene.head_color_picker.draw(sucury.CANVAS),
+    }
+    if sucury.BACKEND:
+        functions["cells_upload"] = lambda: sucury.BACKEND.stream("cells", scene.cells.surface)
+        functions["present"] = lambda: sucury.BACKEND.present()
+    else:
+        functions["snake_draw"] = lambda: snake.draw(sucury.SCREEN)
+        functions["display_update"] = lambda: pygame.display.update()
+    calls = max(frames // 4, 10)
+
+    frame = percentiles(durations)
+    return {
+        "backend": backend, "mode": mode, "grid_size": grid_size, "window": [width, height],
+        "board": [game.cols, game.rows], "length": length,
+        "frames": frames, "fps": 1000 / frame["mean"], "frame_ms": frame,
+        "functions_ms": {name: percentiles(time_calls(function, calls)) for name, function in functions.items()},
+    }
+
+def config_key(result):
+    return (result.get("backend", "surface"), result["mode"], result["grid_size"], tuple(result["window"]), result["length"])
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def window_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Sucury rendering path, headless.")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=[2, 10, 25, 50, 100],
+                        help=f"grid sizes, in pixels ({sucury.GRID_SIZE_MIN}..{sucury.GRID_SIZE_MAX})")
+    parser.add_argument("--windows", type=window_size, nargs="+", default=[(320, 320), (650, 650), (1280, 720)],
+                        help="window sizes, as WIDTHxHEIGHT")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000], help="snake lengths")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--backends", nargs="+", choices=sucury.BACKENDS, default=["surface"])
+    parser.add_argument("--frames", type=int, default=300, help="frames measured per configuration")
+    parser.add_argument("--warmup", type=int, default=30, help="frames run before measuring")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="slowdown allowed by --compare (0.1: 10%%)")
+    args = parser.parse_args()
+
+    for grid_size in args.grid_sizes:
+        if not sucury.GRID_SIZE_MIN <= grid_size <= sucury.GRID_SIZE_MAX:
+            parser.error(f"grid size {grid_size} out of range")
+
+    sucury.init()
+
+    results, skipped = [], []
+    print(f"{'backend':<10}{'mode':<12}{'grid':>5}{'window':>11}{'board':>9}{'length':>8}"
+          f"{'fps':>10}{'p50':>8}{'p95':>8}{'p99':>8}")
+    for backend in args.backends:
+        for mode in args.modes:
+            for width, height in args.windows:
+                for grid_size in args.grid_sizes:
+                    for length in args.lengths:
+                        result = run_config(backend, mode, grid_size, width, height, length, args.frames, args.warmup)
+                        if result is None:
+                            skipped.append({"backend": backend, "mode": mode, "grid_size": grid_size,
+                                            "window": [width, height], "length": length})
+                            continue
+                        results.append(result)
+                        frame = result["frame_ms"]
+                        print(f"{backend:<10}{mode:<12}{grid_size:>5}{f'{width}x{height}':>11}"
+                              f"{'x'.join(map(str, result['board'])):>9}{length:>8}{result['fps']:>10,.0f}"
+                              f"{frame['p50']:>8.3f}{frame['p95']:>8.3f}{frame['p99']:>8.3f}")
+    if skipped:
+        print(f"({len(skipped)} configurations skipped: snake longer than the board)")
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+        "frames": args.frames,
+        "warmup": args.warmup,
+        "results": results,
+        "skipped": skipped,
+    }
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = {config_key(result): result for result in json.load(file)["results"]}
+        regressions = 0
+        for result in results:
+            before = baseline.get(config_key(result))
+            if before is None:
+                continue
+            ratio = result["fps"] / before["fps"]
+            if ratio < 1 - args.tolerance:
+                regressions += 1
+                backend, mode, grid_size, window, length = config_key(result)
+                print(f"slower: {backend} {mode} grid {grid_size} window {window[0]}x{window[1]} length {length}: "
+                      f"{before['fps']:,.0f} -> {result['fps']:,.0f} fps ({ratio - 1:+.0%})")
+        print(f"compared with {args.compare}: {regressions} regressions")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
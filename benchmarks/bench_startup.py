@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measure the time to the first frame of the game, from a fresh process.
+#
+#    python3 benchmarks/bench_startup.py [--runs N] [--video-driver DRIVER]
+#
+# Each run starts a new Python process (headless by default: SDL dummy
+# drivers) that imports sucury.py, opens the window and shows the main
+# menu, and reports how long each step took since the process started, and
+# when all the assets were loaded.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child process. Times are in ms since the interpreter started
+# running this script.
+
+CHILD = r"""
+import json, time
+start = time.perf_counter()
+ms = lambda: (time.perf_counter() - start) * 1000
+times = {}
+
+import pygame
+import sucury
+times["import"] = ms()
+
+sucury.init()
+times["init"] = ms()
+
+# Stop the menu right after its first frame is shown.
+update = pygame.display.update
+def first_update(*args):
+    update(*args)
+    if "first_frame" not in times:
+        times["first_frame"] = ms()
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+pygame.display.update = first_update
+
+scene = sucury.MenuScene()
+scene.enter()
+scene.frame()
+
+for future in list(sucury.ASSETS.loading.values()):
+    future.result()
+times["assets_loaded"] = ms()
+print(json.dumps(times))
+"""
+
+STEPS = ("import", "init", "first_frame", "assets_loaded")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Sucury time to first frame.")
+    parser.add_argument("--runs", type=int, default=10, help="processes started")
+    parser.add_argument("--video-driver", default="dummy", help="SDL video driver (dummy: headless)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, SDL_VIDEODRIVER=args.video_driver, SDL_AUDIODRIVER="dummy",
+               PYGAME_HIDE_SUPPORT_PROMPT="1")
+    runs = []
+    for _ in range(args.runs):
+        child = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env,
+                               capture_output=True, text=True)
+        if child.returncode:
+            sys.exit(f"bench_startup: the game failed to start:\n{child.stderr}")
+        runs.append(json.loads(child.stdout.splitlines()[-1]))
+
+    print(f"{'ms since start':<16}{'min':>9}{'median':>9}{'max':>9}")
+    summary = {}
+    for step in STEPS:
+        values = sorted(run[step] for run in runs)
+        summary[step] = {"min": values[0], "median": values[len(values) // 2], "max": values[-1]}
+        print(f"{step:<16}{values[0]:>9.1f}{values[len(values) // 2]:>9.1f}{values[-1]:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"runs": runs, "summary": summary}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import textcache
+
 class Button():
 	def __init__(self, image, pos, text_input, font, base_color, hovering_color):
 		self.image = image
@@ -6,7 +8,7 @@ class Button():
 		self.font = font
 		self.base_color, self.hovering_color = base_color, hovering_color
 		self.text_input = text_input
-		self.text = self.font.render(self.text_input, True, self.base_color)
+		self.text = textcache.render(self.font, self.text_input, True, self.base_color)
 		if self.image is None:
 			self.image = self.text
 		self.rect = self.image.get_rect(center=(self.x_pos, self.y_pos))
@@ -24,6 +26,6 @@ class Button():
 
 	def changeColor(self, position):
 		if position[0] in range(self.rect.left, self.rect.right) and position[1] in range(self.rect.top, self.rect.bottom):
-			self.text = self.font.render(self.text_input, True, self.hovering_color)
+			self.text = textcache.render(self.font, self.text_input, True, self.hovering_color)
 		else:
-			self.text = self.font.render(self.text_input, True, self.base_color)
\ No newline at end of file
+			self.text = textcache.render(self.font, self.text_input, True, self.base_color)
\ No newline at end of file
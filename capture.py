@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Frame capture: the frames shown on the screen, saved as raw video for an
+# encoder to pick up.
+#
+#    python3 sucury.py --capture game.raw
+#    python3 sucury.py --replay last_game.sucr --headless --capture "|ffmpeg -f rawvideo ..."
+#
+# grab() is called right after the display is updated. It reads the pixels
+# in place (through the surface buffer, with no conversion) and copies them
+# once, into one of a few preallocated buffers: the screen is drawn over on
+# the next frame, so the frame has to be kept somewhere, but nothing is
+# allocated per frame. A writer thread takes the filled buffers and writes
+# them out (file writes release the GIL), then hands them back. If all the
+# buffers are waiting to be written, the frame is dropped rather than
+# making the game wait, unless the capture blocks (rendering offline, where
+# every frame counts and nobody is waiting).
+#
+# The output is the bare pixels, frame after frame, in the screen pixel
+# format (pixel_format() gives its name for ffmpeg's -pix_fmt; summary()
+# gives the whole command). It goes to a file (a named pipe works too), or,
+# for a path starting with "|", to the input of that command.
+
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+CAPTURE_BUFFERS = 8       # Frames waiting to be written before frames are dropped.
+
+# The ffmpeg name of the pixel format of a surface (bytes in memory order).
+
+def pixel_format(surface):
+    size = surface.get_bytesize()
+    names = dict(zip(surface.get_masks(), "rgba"))
+    channels = ""
+    for i in range(size):
+        shift = 8*i if sys.byteorder == "little" else 8*(size - 1 - i)
+        channels += names.get(0xff << shift, "0")
+    if size == 4:
+        return channels
+    if size == 3:
+        return channels + "24"
+    raise ValueError(f"cannot capture {8*size}-bit surfaces")
+
+# A clock for rendering faster than real time: every frame moves the game
+# 1/fps of a second on, with no waiting (see sucury.py --headless).
+
+class FrameClock:
+
+    def __init__(self, fps):
+        self.frame_time = 1000 / fps
+
+    def tick(self, framerate=0):
+        return self.frame_time
+
+class Capture:
+
+    def __init__(self, path, buffers=CAPTURE_BUFFERS, block=False):
+        self.path = path
+        self.process = None
+        if path.startswith("|"):
+            self.process = subprocess.Popen(shlex.split(path[1:]), stdin=subprocess.PIPE)
+            self.file = self.process.stdin
+        else:
+            self.file = open(path, "wb")
+
+        self.buffers = buffers
+        self.block = block
+        self.free = queue.SimpleQueue()     # Buffers ready to take a frame.
+        self.full = queue.SimpleQueue()     # Frames to write, then None to stop.
+        self.size = None                    # Frame size and format, set by the first frame.
+        self.format = None
+        self.frames = 0                     # Frames captured.
+        self.dropped = 0                    # Frames dropped (no free buffer).
+        self.error = None                   # Why writing stopped, if it failed.
+
+        self.thread = threading.Thread(target=self.write_frames, name="capture", daemon=True)
+        self.thread.start()
+
+    # Take a copy of the surface, to be written out. Returns False if the
+    # frame was dropped.
+
+    def grab(self, surface):
+        if self.error is not None:
+            return False
+        if self.size is None:
+            self.size, self.format = surface.get_size(), pixel_format(surface)
+            width, height = self.size
+            for _ in range(self.buffers):
+                self.free.put(np.empty((height, width * surface.get_bytesize()), dtype=np.uint8))
+        elif surface.get_size() != self.size:
+            self.dropped += 1                # Frames must all be the same size.
+            return False
+
+        try:
+            frame = self.free.get(self.block)
+        except queue.Empty:
+            self.dropped += 1
+            return False
+
+        # The surface pixels, rows 'pitch' bytes apart (a view: the surface
+        # stays locked until it is released).
+        pixels = np.frombuffer(surface.get_buffer(), dtype=np.uint8).reshape(self.size[1], surface.get_pitch())
+        np.copyto(frame, pixels[:, :frame.shape[1]])
+        del pixels
+
+        self.full.put(frame)
+        self.frames += 1
+        return True
+
+    # In the writer thread.
+
+    def write_frames(self):
+        while True:
+            frame = self.full.get()
+            if frame is None:
+                break
+            if self.error is None:
+                try:
+                    self.file.write(frame)
+                except (OSError, ValueError) as error:     # E.g. the encoder quit.
+                    self.error = error
+            self.free.put(frame)
+
+    # Write the frames still waiting and close the output.
+
+    def close(self):
+        self.full.put(None)
+        self.thread.join()
+        try:
+            self.file.close()
+        except OSError as error:
+            self.error = self.error or error
+        if self.process is not None:
+            self.process.wait()
+
+    # What was captured, and how to encode it.
+
+    def summary(self, fps):
+        lines = [f"captured {self.frames} frames, dropped {self.dropped}, to {self.path}"]
+        if self.error is not None:
+            lines.append(f"writing stopped: {self.error}")
+        if self.size is not None:
+            lines.append(f"encode with: ffmpeg -f rawvideo -pix_fmt {self.format} "
+                         f"-s {self.size[0]}x{self.size[1]} -r {fps} -i {self.path if self.process is None else '-'} out.mp4")
+        return "\n".join(lines)
@@ -0,0 +1,507 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# This module holds the rules of the game, with no display attached. Every
+# position here is measured in grid cells (not pixels), so the same engine
+# can be stepped by the interactive game in sucury.py, by bots, by tests and
+# by analytics tools, as fast as the CPU allows.
+#
+#    game = new_game(13, 13, seed=42)
+#    game, event = step(game, RIGHT)
+#
+# All randomness comes from the game's own generator (game.rng), so the same
+# seed and the same turns always produce the same game. A game can be forked
+# with clone() (e.g. to search ahead) and saved with to_bytes().
+
+import random
+import struct
+import sys
+from array import array
+from collections import deque
+
+##
+## Game rules.
+##
+
+APPLE     = 0  # Apple is the default fruit (type 0)
+PEAR      = 1  # Pear is fruit type 1: makes the snake faster
+BLUEBERRY = 2  # Blueberry is fruit type 2: makes the snake slower
+ORANGE    = 3  # Orange is fruit type 3: makes the snake grow twice
+
+FRUIT_TYPES = 4
+
+START_SPEED = 7              # Initial speed, in moves per second.
+MIN_SPEED, MAX_SPEED = 2, 12 # Speed limits reachable by eating fruit.
+
+START_POS_PADDING = 3        # Keep the snake from starting too close to the border.
+
+# Directions, as (xmov, ymov) pairs.
+
+UP    = (0, -1)
+DOWN  = (0, 1)
+LEFT  = (-1, 0)
+RIGHT = (1, 0)
+
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+
+MOVEMENT_QUEUE_SIZE = 2      # Limit the queued turns to prevent too much lag.
+
+# Events reported by step().
+
+NOTHING = 0   # The snake just moved.
+ATE     = 1   # The snake ate a fruit (its type is left in game.eaten).
+WALL    = 2   # The snake died crashing into the border.
+BITE    = 3   # The snake died biting itself.
+WIN     = 4   # The snake filled the whole board: no room left for fruit.
+
+DEATHS = (WALL, BITE)
+
+##
+## The game state.
+##
+
+# Cells are packed into a single integer, y*cols + x, so that the snake body
+# is a flat array of ints and no objects are allocated while it moves.
+
+class GameState:
+
+    # Slots keep each state small and quick to access.
+
+    __slots__ = ("cols", "rows", "rng", "ring", "head_slot", "length", "head",
+                 "direction", "queue", "growth", "alive", "fruit", "fruit_type",
+                 "eaten", "speed", "tick", "games", "occupied", "free", "free_slot")
+
+    def __init__(self, cols, rows, seed=None):
+        self.cols, self.rows = cols, rows
+        self.rng = random.Random(seed)
+        cells = cols * rows
+
+        # The snake body is a ring buffer with room for the whole board:
+        # ring[head_slot] is the head and the 'length' slots behind it (going
+        # backwards, wrapping around) are the tail. Moving writes one slot
+        # and growing just skips releasing the tail end, both in O(1).
+
+        self.ring = array("i", bytes(4 * cells))
+        self.head_slot = 0
+        self.length = 0            # Segments, head included (0: no snake yet).
+
+        # Occupancy bitmap: one byte per cell, set while the snake covers
+        # the cell. Collision checks are a single lookup.
+
+        self.occupied = bytearray(cells)
+
+        # Index of the free cells: 'free' lists them in no particular order
+        # and 'free_slot' tells where each cell sits in that list (-1 if the
+        # cell is occupied), so that cells can be taken and given back in
+        # O(1) and a random free cell is a single draw.
+
+        self.free = array("i", range(cells))
+        self.free_slot = array("i", range(cells))
+
+        # Type of the fruit on the board (kept if no fruit can drop, e.g. on
+        # a board the snake fills from the start).
+        self.fruit_type = APPLE
+
+        # Games played on this state: reset() starts a new one, so a tick
+        # number alone does not tell two games apart (see observation.py).
+        self.games = 0
+
+        reset(self)
+
+    # Score is the tail length (head not included), as shown on screen.
+
+    @property
+    def score(self):
+        return self.length - 1
+
+    # Tail cells, nearest to the head first.
+
+    @property
+    def body(self):
+        ring, cap = self.ring, len(self.ring)
+        return [ring[(self.head_slot - i) % cap] for i in range(1, self.length)]
+
+##
+## The game logic.
+##
+
+def new_game(cols, rows, seed=None):
+    return GameState(cols, rows, seed)
+
+# Convert between packed cells and (x, y) coordinates.
+
+def cell_xy(game, cell):
+    return cell % game.cols, cell // game.cols
+
+def xy_cell(game, x, y):
+    return y*game.cols + x
+
+# The last tail segment (the head itself, if there is no tail).
+
+def tail_end(game):
+    return game.ring[(game.head_slot - game.length + 1) % len(game.ring)]
+
+# Mark a cell as covered by the snake, taking it out of the free index.
+
+def occupy(game, cell):
+    free, slot = game.free, game.free_slot
+    i = slot[cell]
+    last = free.pop()
+    if last != cell:          # Move the last free cell into the hole.
+        free[i] = last
+        slot[last] = i
+    slot[cell] = -1
+    game.occupied[cell] = 1
+
+# Give a cell back to the free index.
+
+def release(game, cell):
+    game.occupied[cell] = 0
+    game.free_slot[cell] = len(game.free)
+    game.free.append(cell)
+
+# Put a fresh snake and a fruit on the board (also used to respawn). If a
+# seed is given, the game random generator starts over from it, so the new
+# game can be reproduced exactly (see replay.py).
+
+def reset(game, seed=None):
+    rng = game.rng
+    if seed is not None:
+        rng.seed(seed)
+    ring, cap = game.ring, len(game.ring)
+
+    # Clear the cells left by the previous snake, if any (a head that bit
+    # the tail shares its cell with the tail).
+
+    for i in range(game.length):
+        cell = ring[(game.head_slot - i) % cap]
+        if game.occupied[cell]:
+            release(game, cell)
+
+    # Where the fruit falls depends on the order of the free index too, which
+    # the previous snake shuffled: a seeded game starts from the order of a
+    # new game (as replays are played back).
+
+    if seed is not None:
+        cells = game.cols * game.rows
+        game.free[:] = array("i", range(cells))
+        game.free_slot[:] = array("i", range(cells))
+
+    # Random start position, away from the borders (if the board allows).
+
+    pad_x = min(START_POS_PADDING, (game.cols - 1) // 2)
+    pad_y = min(START_POS_PADDING, (game.rows - 1) // 2)
+    x = rng.randint(pad_x, game.cols - 1 - pad_x)
+    y = rng.randint(pad_y, game.rows - 1 - pad_y)
+
+    # If the snake starts at the right side of the board, it goes left;
+    # otherwise, it goes right.
+
+    game.direction = LEFT if x > game.cols / 2 else RIGHT
+
+    game.head = y*game.cols + x
+    game.head_slot = 0
+    ring[0] = game.head
+    game.length = 1
+    occupy(game, game.head)
+
+    game.queue = deque(maxlen=MOVEMENT_QUEUE_SIZE)
+    game.growth = 0           # How many moves the tail should stay put.
+    game.alive = True
+    game.eaten = None
+    game.speed = START_SPEED
+    game.tick = 0
+    game.games += 1
+
+    spawn_fruit(game)
+
+# Drop a fruit onto a random cell not covered by the snake. Returns False
+# (and leaves no fruit) if the snake covers the whole board.
+
+def spawn_fruit(game):
+    rng = game.rng
+    free = game.free
+    if not free:
+        game.fruit = None
+        return False
+    game.fruit = free[rng.randrange(len(free))]
+    game.fruit_type = rng.randrange(FRUIT_TYPES)
+    return True
+
+# Queue a turn to be taken on one of the next moves.
+
+def steer(game, direction):
+    game.queue.append(direction)
+
+# Advance the game by one move.
+#
+# If an action (direction) is given, the snake turns right away; otherwise
+# it takes the next queued turn, if any. Returns the same (mutated) state and
+# the event that happened. Once the game is over (the snake died or won),
+# call reset() to respawn.
+
+def step(game, action=None):
+    if not game.alive:
+        return game, NOTHING
+
+    if action is None and game.queue:
+        action = game.queue.popleft()
+    if action is not None:
+        game.direction = action
+
+    game.tick += 1
+    xmov, ymov = game.direction
+    cols = game.cols
+    y, x = divmod(game.head, cols)
+    x += xmov
+    y += ymov
+
+    # Check for border crash (the head stays on the last cell it reached).
+
+    if x < 0 or y < 0 or x >= cols or y >= game.rows:
+        game.alive = False
+        return game, WALL
+
+    # The old head becomes the first tail segment. If the snake should grow,
+    # keep the last segment, else remove it (freeing its cell).
+
+    ring = game.ring
+    cap = len(ring)
+    if game.growth:
+        game.growth -= 1
+        game.length += 1
+    else:
+        release(game, ring[(game.head_slot - game.length + 1) % cap])
+
+    game.head = head = y*cols + x
+    game.head_slot = slot = (game.head_slot + 1) % cap
+    ring[slot] = head
+
+    # Check for self-bite.
+
+    if game.occupied[head]:
+        game.alive = False
+        return game, BITE
+    occupy(game, head)
+
+    # If the head passes over a fruit, lengthen the snake and drop another fruit.
+
+    if head == game.fruit:
+        kind = game.fruit_type
+        game.growth += 1
+        if kind == PEAR:                 # Pear makes snake faster
+            game.speed = min(game.speed + 1, MAX_SPEED)
+        elif kind == BLUEBERRY:          # Blueberry makes snake slower
+            game.speed = max(game.speed - 1, MIN_SPEED)
+        elif kind == ORANGE:             # Orange grows the snake by 2 instead of 1
+            game.growth += 1
+        game.eaten = kind
+
+        # If there is no room left for another fruit, the player wins.
+
+        if not spawn_fruit(game):
+            game.alive = False
+            return game, WIN
+        return game, ATE
+
+    return game, NOTHING
+
+##
+## Snapshots.
+##
+
+# Searching ahead (rollouts, MCTS...) forks the game many times per move.
+# clone() copies a state, random generator included, with a few array copies
+# done in C (no Python loop over the body), so the copy can be stepped
+# without touching the original and both play on identically.
+
+def clone(game):
+    copy = GameState.__new__(GameState)
+    copy.cols, copy.rows = game.cols, game.rows
+
+    copy.rng = random.Random.__new__(random.Random)   # No seeding: the state is copied.
+    copy.rng.setstate(game.rng.getstate())
+
+    copy.ring = game.ring[:]
+    copy.head_slot = game.head_slot
+    copy.length = game.length
+    copy.head = game.head
+    copy.direction = game.direction
+    copy.queue = deque(game.queue, MOVEMENT_QUEUE_SIZE)
+    copy.growth = game.growth
+    copy.alive = game.alive
+    copy.fruit = game.fruit
+    copy.fruit_type = game.fruit_type
+    copy.eaten = game.eaten
+    copy.speed = game.speed
+    copy.tick = game.tick
+    copy.games = game.games
+    copy.occupied = game.occupied[:]
+    copy.free = game.free[:]
+    copy.free_slot = game.free_slot[:]
+    return copy
+
+# A state as bytes, and back. Layout (little-endian):
+#
+#    header     SNAPSHOT_HEADER fields (see below)
+#    queue      one byte per queued turn (index into DIRECTIONS)
+#    body       'length' int32 cells, from the tail end to the head
+#    free       int32 free cells, in the order of the free index (it
+#               decides where the next fruits drop)
+#    rng        625 uint32 words of the generator state, then a flag and
+#               a double for its cached gaussian value
+#
+# The occupancy grid and the positions in the free index are rebuilt when
+# loading.
+
+SNAPSHOT_MAGIC = b"SUCS"
+SNAPSHOT_VERSION = 2
+
+# Magic, version, cols, rows, length, free cells, direction, queued turns,
+# growth, alive, fruit (-1: none), fruit type, eaten (-1: none), speed, tick,
+# games.
+
+SNAPSHOT_HEADER = struct.Struct("<4sBHHIIBBIBiBbBQI")
+SNAPSHOT_GAUSS = struct.Struct("<Bd")
+RNG_WORDS = 625
+
+class SnapshotError(Exception):
+    pass
+
+# Arrays are stored little-endian whatever the machine.
+
+def le_bytes(values):
+    if sys.byteorder == "big":
+        values = values[:]
+        values.byteswap()
+    return values.tobytes()
+
+def le_array(typecode, data):
+    values = array(typecode, data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+# Whether any of 'count' int32 values stored from data[start] is negative:
+# the sign bit is the top bit of the last byte of each, so dropping the
+# bytes below 0x80 must leave nothing.
+
+LOW_BYTES = bytes(range(0x80))
+
+def any_negative(data, start, count):
+    return bool(bytes(data[start + 3:start + 4*count:4]).translate(None, LOW_BYTES))
+
+def to_bytes(game):
+    ring, cap = game.ring, len(game.ring)
+    first = (game.head_slot - game.length + 1) % cap
+    if first + game.length <= cap:
+        body = ring[first:first + game.length]
+    else:
+        body = ring[first:] + ring[:first + game.length - cap]
+
+    version, words, gauss = game.rng.getstate()
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, game.cols, game.rows, game.length, len(game.free),
+        DIRECTIONS.index(game.direction), len(game.queue), game.growth, game.alive,
+        game.fruit if game.fruit is not None else -1, game.fruit_type,
+        game.eaten if game.eaten is not None else -1, game.speed, game.tick, game.games)
+
+    return b"".join((
+        header,
+        bytes(DIRECTIONS.index(direction) for direction in game.queue),
+        le_bytes(body),
+        le_bytes(game.free),
+        le_bytes(array("I", words)),
+        SNAPSHOT_GAUSS.pack(gauss is not None, gauss or 0.0),
+    ))
+
+def from_bytes(data):
+    try:
+        (magic, version, cols, rows, length, free_count, direction, queued, growth, alive,
+         fruit, fruit_type, eaten, speed, tick, games) = SNAPSHOT_HEADER.unpack_from(data)
+    except struct.error:
+        raise SnapshotError("truncated snapshot") from None
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("not a game snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+
+    cells = cols * rows
+    pos = SNAPSHOT_HEADER.size
+    sizes = (queued, 4 * length, 4 * free_count, 4 * RNG_WORDS, SNAPSHOT_GAUSS.size)
+    if len(data) != pos + sum(sizes) or not 1 <= length <= cells or free_count > cells:
+        raise SnapshotError("corrupt snapshot")
+    if (direction >= len(DIRECTIONS) or any(code >= len(DIRECTIONS) for code in data[pos:pos + queued])
+            or fruit >= cells or fruit_type >= FRUIT_TYPES or eaten >= FRUIT_TYPES):
+        raise SnapshotError("corrupt snapshot")
+
+    game = GameState.__new__(GameState)
+    game.cols, game.rows = cols, rows
+
+    game.queue = deque((DIRECTIONS[code] for code in data[pos:pos + queued]), MOVEMENT_QUEUE_SIZE)
+    pos += queued
+
+    # Cells past the board end fail as indexes below; negative ones would
+    # not (they count from the end), so they are looked for first.
+
+    if any_negative(data, pos, length + free_count):
+        raise SnapshotError("corrupt snapshot: cell off the board")
+
+    # The body goes at the start of the ring, the head in slot length-1.
+
+    body = le_array("i", data[pos:pos + 4 * length])
+    pos += 4 * length
+    game.ring = body + array("i", bytes(4 * (cells - length)))
+    game.head_slot = (length - 1) % cells
+    game.length = length
+    game.head = body[-1]
+
+    game.free = le_array("i", data[pos:pos + 4 * free_count])
+    pos += 4 * free_count
+
+    game.occupied = bytearray(cells)
+    game.free_slot = array("i", [-1]) * cells
+    try:
+        for cell in body:
+            game.occupied[cell] = 1
+        for i, cell in enumerate(game.free):
+            game.free_slot[cell] = i
+    except IndexError:
+        raise SnapshotError("corrupt snapshot: cell off the board") from None
+
+    words = le_array("I", data[pos:pos + 4 * RNG_WORDS])
+    pos += 4 * RNG_WORDS
+    has_gauss, gauss = SNAPSHOT_GAUSS.unpack_from(data, pos)
+    game.rng = random.Random.__new__(random.Random)
+    try:
+        game.rng.setstate((3, tuple(words), gauss if has_gauss else None))
+    except ValueError:
+        raise SnapshotError("corrupt snapshot: random generator state") from None
+
+    game.direction = DIRECTIONS[direction]
+    game.growth = growth
+    game.alive = bool(alive)
+    game.fruit = fruit if fruit >= 0 else None
+    game.fruit_type = fruit_type
+    game.eaten = eaten if eaten >= 0 else None
+    game.speed = speed
+    game.tick = tick
+    game.games = games
+    return game
@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Persistent high scores (highscores.sav).
+#
+# The file is a header followed by fixed-size records (score, time, CRC32).
+# New scores are appended; once the file holds too many records it is
+# compacted down to the best ones, written to a temporary file and moved
+# over the old one, so a crash never leaves a half-written file behind (a
+# torn record at the end fails its CRC and is ignored). Since the file never
+# holds much more than the best TOP_SCORES records, loading it is cheap.
+#
+# The game only touches the in-memory list: writing happens in a background
+# thread, which gathers scores in batches and syncs them to disk.
+#
+#    scores = HighScores("highscores.sav")
+#    scores.add(42)
+#    scores.best()
+#    scores.close()
+
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+HEADER = b"SUCH" + struct.pack("<I", 1)   # Magic and format version.
+RECORD = struct.Struct("<III")            # Score, time (Unix seconds), CRC32.
+
+TOP_SCORES = 10        # How many scores are kept.
+COMPACT_SLACK = 50     # Records appended before the file is compacted.
+FLUSH_DELAY = 0.5      # Seconds the writer waits to gather a batch of scores.
+
+def pack_record(score, when):
+    head = struct.pack("<II", score, when)
+    return head + struct.pack("<I", zlib.crc32(head))
+
+class HighScores:
+
+    def __init__(self, path, size=TOP_SCORES):
+        self.path = path
+        self.size = size
+        self.top = None            # Best (score, time) first, loaded lazily.
+        self.records = 0           # Records in the file.
+        self.needs_compaction = False
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.writer = None
+
+    ## Reading.
+
+    def load(self):
+        if self.top is not None:
+            return
+
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b""
+
+        top = []
+        end = len(HEADER)
+        if data[:end] == HEADER:
+            for offset in range(end, len(data) - RECORD.size + 1, RECORD.size):
+                score, when, crc = RECORD.unpack_from(data, offset)
+                if crc != zlib.crc32(data[offset:offset + 8]):
+                    break              # Torn write: ignore the rest.
+                top.append((score, when))
+                end = offset + RECORD.size
+
+        # Rewrite the file before appending to it if it is missing, not in
+        # this format, or ends with garbage.
+        self.needs_compaction = end != len(data) or not data
+
+        top.sort(reverse=True)
+        self.records = len(top)
+        self.top = top[:self.size]
+
+    # The best scores, as (score, time) pairs, best first.
+
+    def scores(self):
+        self.load()
+        with self.lock:
+            return list(self.top)
+
+    def best(self):
+        self.load()
+        return self.top[0][0] if self.top else 0
+
+    ## Writing.
+
+    # Record a score. Returns right away; the disk is written later.
+
+    def add(self, score):
+        self.load()
+        entry = (score, int(time.time()))
+        with self.lock:
+            self.top.append(entry)
+            self.top.sort(reverse=True)
+            del self.top[self.size:]
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_loop, name="highscores", daemon=True)
+            self.writer.start()
+        self.queue.put(entry)
+
+    # Wait for pending scores to be written and stop the writer.
+
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def write_loop(self):
+        while True:
+
+            # Gather whatever arrives within FLUSH_DELAY into one batch.
+
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + FLUSH_DELAY
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            entries = [entry for entry in batch if entry is not None]
+
+            if entries:
+                try:
+                    if self.needs_compaction or self.records + len(entries) > self.size + COMPACT_SLACK:
+                        self.compact()
+                    else:
+                        self.append(entries)
+                except OSError:
+                    # Keep the scores in memory; retry with a full rewrite next time.
+                    self.needs_compaction = True
+
+            if stop:
+                return
+
+    def append(self, entries):
+        data = b"".join(pack_record(score, when) for score, when in entries)
+        with open(self.path, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self.records += len(entries)
+
+    # Replace the file, atomically, by one holding only the best scores.
+
+    def compact(self):
+        with self.lock:
+            top = list(self.top)
+
+        data = HEADER + b"".join(pack_record(score, when) for score, when in top)
+
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.path)
+
+        # Make the rename itself durable (where directories can be synced).
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        self.records = len(top)
+        self.needs_compaction = False
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# The board as a NumPy tensor, for bots and analytics.
+#
+# An Observer keeps a uint8 array of shape (frames, CHANNELS, rows + 2,
+# cols + 2) for one game: the board with a one-cell border all around, in
+# which the wall channel is set. Channels:
+#
+#    HEAD    1 on the head
+#    BODY    1 on the tail segments (the occupancy grid, head excluded)
+#    FRUIT   fruit type + 1 on the fruit (engine.APPLE..ORANGE), else 0
+#    WALL    1 on the border
+#
+# After each move, update() rewrites only the few cells the move can change
+# (old and new head, tail end, old and new fruit), so the cost does not
+# depend on the snake length. If the game was not stepped exactly once since
+# the last update (a new game, a respawn, several moves), the board is
+# rebuilt instead, from the occupancy grid, in a few array operations. A
+# reset is told by the game counter of the state (engine's game.games), not
+# by the tick: the next game may well be at the tick after the last one seen.
+#
+#    observer = Observer(game, frames=4)
+#    game, event = engine.step(game, action)
+#    board = observer.update()          # (4, CHANNELS, rows + 2, cols + 2)
+#    data = memoryview(board)           # the same memory, no copy
+#
+# With frames > 1, the last frames are stacked, oldest first. The array
+# returned is a view into the observer's buffer: it stays valid until the
+# next update() and is never copied (it is C-contiguous, so it can also be
+# handed over through the buffer protocol).
+#
+#    python3 observation.py --check
+#
+# compares incremental updates with rebuilt boards over random games.
+
+import argparse
+import random
+import sys
+
+import numpy as np
+
+import engine
+
+HEAD, BODY, FRUIT, WALL = range(4)
+CHANNELS = 4
+
+# The occupancy grid of a game as a (rows, cols) array sharing its memory:
+# it follows the game as it moves, with no copy.
+
+def occupancy(game):
+    return np.frombuffer(game.occupied, dtype=np.uint8).reshape(game.rows, game.cols)
+
+class Observer:
+
+    def __init__(self, game, frames=1):
+        self.game = game
+        self.frames = frames
+
+        # Each frame is kept twice, at slot and slot + frames, so that the
+        # last 'frames' frames are always the contiguous run
+        # buffer[slot + 1:slot + frames + 1] (no copy to put them in order).
+        # With a single frame, there is just the one.
+
+        copies = 2 * frames if frames > 1 else 1
+        self.buffer = np.zeros((copies, CHANNELS, game.rows + 2, game.cols + 2), dtype=np.uint8)
+        walls = self.buffer[:, WALL]
+        walls[:, 0, :] = walls[:, -1, :] = walls[:, :, 0] = walls[:, :, -1] = 1
+
+        self.slot = 0
+        self.tick = None           # Game tick of the last update (None: never updated),
+        self.games = None          # and game number (game.games) at that time.
+        self.head = self.tail = self.fruit = None
+        self.update()
+
+    # Bring the board up to date with the game (which may be another game
+    # of the same size, e.g. a clone). Returns the stacked frames.
+
+    def update(self, game=None):
+        if game is not None and game is not self.game:
+            if (game.cols, game.rows) != (self.game.cols, self.game.rows):
+                raise ValueError("the observer was made for another board size")
+            self.game, self.tick = game, None
+        game = self.game
+
+        previous = self.buffer[self.latest()]
+        if self.frames > 1:
+            self.slot = (self.slot + 1) % self.frames
+        board = self.buffer[self.slot]
+
+        if self.tick is not None and game.games == self.games and game.tick == self.tick + 1:
+            if self.frames > 1:
+                board[:] = previous
+            for cell in (self.head, self.tail, self.fruit, game.head, game.fruit):
+                if cell is not None:
+                    self.paint(board, cell)
+        else:
+            self.rebuild(board)
+            if self.frames > 1 and (self.tick is None or game.games != self.games):
+                self.buffer[:] = board            # A new game: no history yet.
+
+        if self.frames > 1:
+            self.buffer[self.slot + self.frames] = board
+
+        self.tick, self.games = game.tick, game.games
+        self.head, self.tail, self.fruit = game.head, engine.tail_end(game), game.fruit
+        return self.observation()
+
+    # The stacked frames, oldest first (a view, not a copy).
+
+    def observation(self):
+        if self.frames == 1:
+            return self.buffer
+        return self.buffer[self.slot + 1:self.slot + self.frames + 1]
+
+    def latest(self):
+        return self.slot + self.frames if self.frames > 1 else 0
+
+    # Set the channels of one cell from the game.
+
+    def paint(self, board, cell):
+        game = self.game
+        y, x = divmod(cell, game.cols)
+        y += 1
+        x += 1
+        board[HEAD, y, x] = cell == game.head
+        board[BODY, y, x] = game.occupied[cell] and cell != game.head
+        board[FRUIT, y, x] = game.fruit_type + 1 if cell == game.fruit else 0
+
+    def rebuild(self, board):
+        game = self.game
+        inside = (slice(1, -1), slice(1, -1))
+        board[HEAD:WALL] = 0
+        board[(BODY,) + inside] = occupancy(game)
+        for cell in (game.head, game.fruit):
+            if cell is not None:
+                self.paint(board, cell)
+
+##
+## Check.
+##
+
+# Step random games with an observer each, comparing every incremental
+# update with a board rebuilt from scratch (the stacked frames too).
+
+def check(games=32, cols=10, rows=8, moves=3000, frames=3, seed=0):
+    rng = random.Random(seed)
+    for number in range(games):
+        game = engine.new_game(cols, rows, seed=rng.getrandbits(32))
+        observer = Observer(game, frames)
+        history = [Observer(game).update().copy()[0]] * frames
+
+        for move in range(moves):
+            action = rng.choice(engine.DIRECTIONS) if rng.random() < 0.3 else None
+            game, event = engine.step(game, action)
+            if not game.alive:
+                engine.reset(game)
+                history = []
+            if rng.random() < 0.01:          # Skip an update now and then (rebuild).
+                engine.step(game)
+                if not game.alive:
+                    engine.reset(game)
+                    history = []
+            elif rng.random() < 0.01:        # Start a new game that reaches the tick
+                engine.reset(game)           # after the last one seen (rebuild too).
+                history = []
+                while game.alive and game.tick <= observer.tick:
+                    engine.step(game)
+                if not game.alive:
+                    engine.reset(game)
+
+            stacked = observer.update()
+            expected = Observer(game).update()[0]
+            history = (history + [expected.copy()])[-frames:]
+            history = [history[0]] * (frames - len(history)) + history
+
+            if not np.array_equal(stacked[-1], expected):
+                return f"game {number}, move {move}: incremental board differs from the rebuilt one"
+            if not np.array_equal(stacked, np.stack(history)):
+                return f"game {number}, move {move}: stacked frames differ"
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy observations of Sucury games.")
+    parser.add_argument("--check", action="store_true", help="compare incremental updates with rebuilt boards")
+    parser.add_argument("--games", type=int, default=32)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--moves", type=int, default=3000)
+    parser.add_argument("--frames", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.check:
+        error = check(args.games, args.size, args.size, args.moves, args.frames, args.seed)
+        if error:
+            sys.exit(f"observations are inconsistent: {error}")
+        print(f"{args.games} games x {args.moves} moves: observations match the engine")
+
+if __name__ == "__main__":
+    main()
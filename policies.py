@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Snake-steering policies (autopilots).
+#
+# A policy is made for one game by a factory, policy = factory(game), and is
+# then called before every move: policy(game) returns the direction to take
+# (or None to keep going). Policies are looked up by name:
+#
+#    policy = get_policy("greedy")(game)
+#    game, event = engine.step(game, policy(game))
+#
+# A name of the form "module:attribute" loads a factory from any module.
+
+import importlib
+import random
+from array import array
+
+import autopilot
+import engine
+
+# Directions the snake may take from each direction (no reversal).
+
+TURNS = {direction: [d for d in engine.DIRECTIONS if (d[0] + direction[0], d[1] + direction[1]) != (0, 0)]
+         for direction in engine.DIRECTIONS}
+
+# The cell the head would reach going that way (None if it is a wall).
+
+def next_cell(game, direction):
+    y, x = divmod(game.head, game.cols)
+    x += direction[0]
+    y += direction[1]
+    if x < 0 or y < 0 or x >= game.cols or y >= game.rows:
+        return None
+    return y*game.cols + x
+
+# Whether the head can enter the cell on the next move without dying. The
+# tail end is safe, since it moves away (unless the snake is growing).
+
+def is_safe(game, cell):
+    if cell is None:
+        return False
+    if not game.occupied[cell]:
+        return True
+    return cell == engine.tail_end(game) and not game.growth
+
+##
+## Built-in policies.
+##
+
+# Never turns.
+
+def straight(game):
+    return lambda game: None
+
+# Turns at random now and then. The turns come from a generator of the
+# policy's own, seeded from the state of the game's generator when the game
+# starts, so that the games stay reproducible from their seed. Drawing from
+# the game's generator would move the fruits: they would drop elsewhere
+# than for other policies on the same seeds (and in replays).
+
+def random_turns(game):
+    rng = random.Random(array("I", game.rng.getstate()[1]).tobytes())
+    def policy(game):
+        if rng.random() < 0.2:
+            return rng.choice(TURNS[game.direction])
+        return None
+    return policy
+
+# Heads for the fruit along the shortest Manhattan path, avoiding moves
+# that kill at once.
+
+def greedy(game):
+    def policy(game):
+        fx, fy = engine.cell_xy(game, game.fruit) if game.fruit is not None else (0, 0)
+        best, best_distance = None, None
+        for direction in TURNS[game.direction]:
+            cell = next_cell(game, direction)
+            if not is_safe(game, cell):
+                continue
+            x, y = engine.cell_xy(game, cell)
+            distance = abs(x - fx) + abs(y - fy)
+            if best is None or distance < best_distance:
+                best, best_distance = direction, distance
+        return best
+    return policy
+
+POLICIES = {
+    "straight": straight,
+    "random":   random_turns,
+    "greedy":   greedy,
+    "autopilot": autopilot.Autopilot,
+}
+
+def get_policy(name):
+    if name in POLICIES:
+        return POLICIES[name]
+    if ":" in name:
+        module, attribute = name.split(":", 1)
+        return getattr(importlib.import_module(module), attribute)
+    raise KeyError(f"unknown policy {name!r} (known: {', '.join(POLICIES)})")
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Per-phase frame timing.
+#
+# A frame is split into phases by laps: each lap() records the time spent
+# since the previous one (or since the frame started) under the name of the
+# phase that just ended. The last WINDOW samples of each phase are kept, and
+# stats() gives their percentiles. While the profiler is disabled, start()
+# and lap() return at once, so the instrumentation can stay in place.
+#
+#    profiler.start()
+#    handle_events()
+#    profiler.lap("events")
+#    draw()
+#    profiler.lap("draw")
+#
+# dump() writes the statistics to a .json or .csv file.
+
+import csv
+import json
+import time
+from collections import deque
+
+WINDOW = 600    # Samples kept per phase (10 s at 60 frames per second).
+
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+class Profiler:
+
+    def __init__(self, window=WINDOW):
+        self.enabled = False
+        self.window = window
+        self.samples = {}          # Phase name -> recent durations, in ns.
+        self.frame_start = None
+        self.last = 0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_start = None    # Time spent disabled is not a frame.
+
+    # Mark the start of a frame (and the end of the previous one, recorded
+    # as the "frame" phase).
+
+    def start(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        if self.frame_start is not None:
+            self.record("frame", now - self.frame_start)
+        self.frame_start = self.last = now
+
+    # Mark the end of a phase.
+
+    def lap(self, phase):
+        if not self.enabled or self.frame_start is None:
+            return
+        now = time.perf_counter_ns()
+        self.record(phase, now - self.last)
+        self.last = now
+
+    def record(self, phase, duration):
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.window)
+        samples.append(duration)
+
+    # Statistics of each phase over its recent samples, in milliseconds,
+    # phases in the order they were first seen.
+
+    def stats(self):
+        stats = {}
+        for phase, samples in self.samples.items():
+            ordered = sorted(samples)
+            count = len(ordered)
+            entry = {"count": count, "mean": sum(ordered) / count / 1e6}
+            for name, fraction in PERCENTILES:
+                entry[name] = ordered[min(int(fraction * count), count - 1)] / 1e6
+            entry["max"] = ordered[-1] / 1e6
+            stats[phase] = entry
+        return stats
+
+    def dump(self, path):
+        stats = self.stats()
+        with open(path, "w", newline="") as file:
+            if path.endswith(".csv"):
+                fields = ["count", "mean"] + [name for name, _ in PERCENTILES] + ["max"]
+                writer = csv.writer(file)
+                writer.writerow(["phase"] + [field if field == "count" else field + "_ms" for field in fields])
+                for phase, entry in stats.items():
+                    writer.writerow([phase] + [entry[field] for field in fields])
+            else:
+                json.dump({"unit": "ms", "window": self.window, "phases": stats}, file, indent=2)
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Game recording and playback.
+#
+# Since the engine is deterministic for a given seed, a game is fully
+# described by its board size, its seed and the turns the player made. Only
+# those are recorded, so a replay takes a few bytes per turn no matter how
+# long the game is, and can be re-simulated headlessly at engine speed.
+#
+#    python3 replay.py last_game.sucr [--tick N]
+#    python3 replay.py --check
+#
+# The check records autopilot games one after the other on the same game
+# state, reset with a new seed each time (as sucury.py does), and verifies
+# each recording.
+#
+# File format (integers are unsigned LEB128 varints unless noted):
+#
+#    magic      4 bytes  b"SUCR"
+#    version    1 byte
+#    cols, rows
+#    seed
+#    turns      count, then for each turn (delta_tick << 2 | direction),
+#               delta_tick counted from the previous turn, direction being
+#               an index into engine.DIRECTIONS
+#    ticks      moves played until the game ended
+#    score      final score
+
+import argparse
+import random
+import sys
+import time
+
+import autopilot
+import engine
+
+REPLAY_MAGIC = b"SUCR"
+REPLAY_VERSION = 1
+REPLAY_MAX_CELLS = 1 << 22     # Largest board accepted (the game makes at most 650x650).
+
+# Direction <-> 2-bit code.
+
+DIRECTION_CODES = {direction: code for code, direction in enumerate(engine.DIRECTIONS)}
+
+class ReplayError(Exception):
+    pass
+
+##
+## Varints.
+##
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("truncated replay")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+##
+## A recorded game.
+##
+
+class Replay:
+
+    __slots__ = ("cols", "rows", "seed", "turns", "ticks", "score")
+
+    def __init__(self, cols, rows, seed, turns=None, ticks=0, score=0):
+        self.cols, self.rows, self.seed = cols, rows, seed
+        self.turns = turns if turns is not None else []   # (tick, direction) pairs.
+        self.ticks = ticks
+        self.score = score
+
+    def to_bytes(self):
+        out = bytearray(REPLAY_MAGIC)
+        out.append(REPLAY_VERSION)
+        for value in (self.cols, self.rows, self.seed, len(self.turns)):
+            write_varint(out, value)
+        last = 0
+        for tick, direction in self.turns:
+            write_varint(out, (tick - last) << 2 | DIRECTION_CODES[direction])
+            last = tick
+        write_varint(out, self.ticks)
+        write_varint(out, self.score)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != REPLAY_MAGIC:
+            raise ReplayError("not a replay file")
+        if len(data) < 5:
+            raise ReplayError("truncated replay")
+        if data[4] != REPLAY_VERSION:
+            raise ReplayError(f"unsupported replay version {data[4]}")
+        pos = 5
+        cols, pos = read_varint(data, pos)
+        rows, pos = read_varint(data, pos)
+        if not (cols >= 1 and rows >= 1 and cols * rows <= REPLAY_MAX_CELLS):
+            raise ReplayError(f"bad board size {cols}x{rows}")
+        seed, pos = read_varint(data, pos)
+        count, pos = read_varint(data, pos)
+        turns = []
+        tick = 0
+        for _ in range(count):
+            value, pos = read_varint(data, pos)
+            tick += value >> 2
+            turns.append((tick, engine.DIRECTIONS[value & 3]))
+        ticks, pos = read_varint(data, pos)
+        score, pos = read_varint(data, pos)
+        if pos != len(data):
+            raise ReplayError("trailing bytes after the replay")
+        return cls(cols, rows, seed, turns, ticks, score)
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+def load(path):
+    with open(path, "rb") as file:
+        return Replay.from_bytes(file.read())
+
+##
+## Recording.
+##
+
+# Steps the game in place of engine.step(), taking note of every turn.
+# The game must have been (re)started with the given seed.
+
+class Recorder:
+
+    def __init__(self, game, seed):
+        self.replay = Replay(game.cols, game.rows, seed)
+
+    def step(self, game, action=None):
+        if action is None and game.queue:
+            action = game.queue.popleft()
+        if action is not None and action != game.direction and game.alive:
+            self.replay.turns.append((game.tick, action))
+        game, event = engine.step(game, action)
+        self.replay.ticks = game.tick
+        self.replay.score = game.score
+        return game, event
+
+##
+## Playback.
+##
+
+# Re-simulate a replay, headlessly, up to the given tick (or to the end).
+# Returns the game state at that point.
+
+def play(replay, until=None):
+    if until is None:
+        until = replay.ticks
+    game = engine.new_game(replay.cols, replay.rows, replay.seed)
+    step = engine.step
+    turns = iter(replay.turns)
+    next_tick, next_direction = next(turns, (None, None))
+
+    while game.tick < until and game.alive:
+        if game.tick == next_tick:
+            step(game, next_direction)
+            next_tick, next_direction = next(turns, (None, None))
+        else:
+            step(game)
+    return game
+
+# Check that a replay reproduces the recorded final score.
+
+def verify(replay):
+    game = play(replay)
+    return game.tick == replay.ticks and game.score == replay.score
+
+##
+## Check.
+##
+
+# Record games in a row on one state, as the game does, stopping each one
+# at its end or after max_ticks moves. Returns the number of games whose
+# recording does not reproduce them.
+
+def check(games=50, cols=12, rows=10, max_ticks=3000, seed=0):
+    rng = random.Random(seed)
+    game = engine.new_game(cols, rows)
+    failures = 0
+    for _ in range(games):
+        game_seed = rng.getrandbits(64)
+        engine.reset(game, game_seed)
+        recorder = Recorder(game, game_seed)
+        pilot = autopilot.Autopilot(game)
+        while game.alive and game.tick < max_ticks:
+            recorder.step(game, pilot(game))
+        failures += not verify(recorder.replay)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify (or inspect) a recorded Sucury game.")
+    parser.add_argument("file", nargs="?", help="replay file")
+    parser.add_argument("--tick", type=int, help="show the game state at this tick")
+    parser.add_argument("--check", action="store_true", help="record games in a row and verify each")
+    parser.add_argument("--games", type=int, default=50, help="games recorded by --check")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check(args.games)
+        if failures:
+            sys.exit(f"{failures} of {args.games} recorded games do NOT replay")
+        print(f"{args.games} games recorded in a row: all replays verified")
+        return
+    if args.file is None:
+        parser.error("a replay file is needed (or --check)")
+
+    try:
+        replay = load(args.file)
+    except (OSError, ReplayError) as error:
+        sys.exit(f"{args.file}: {error}")
+
+    start = time.perf_counter()
+    game = play(replay, args.tick)
+    elapsed = time.perf_counter() - start
+
+    print(f"board:  {replay.cols}x{replay.rows}, seed {replay.seed}")
+    print(f"turns:  {len(replay.turns)}")
+    print(f"ticks:  {game.tick} of {replay.ticks}")
+    print(f"score:  {game.score} (recorded {replay.score})")
+    print(f"speed:  {game.tick / max(elapsed * 1000, 1e-9):,.0f} ticks/ms")
+
+    if args.tick is None:
+        if game.tick == replay.ticks and game.score == replay.score:
+            print("replay verified")
+        else:
+            sys.exit("replay does NOT match the recorded score")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 { pkgs ? import <nixpkgs> {} }:
   pkgs.mkShell {
-    nativeBuildInputs = with pkgs.buildPackages; [ python311 python311Packages.pygame ];
+    nativeBuildInputs = with pkgs.buildPackages; [ python311 python311Packages.pygame python311Packages.numpy ];
 }
 
@@ -25,8 +25,27 @@
 
 import pygame
 from button import Button
+import argparse
+import io
+import os
+import numpy as np
 import random
 import sys
+import time
+
+import analytics
+import arena
+import arena_client
+import assets
+import autopilot
+import backend
+import capture
+import engine
+import highscores
+import profiler
+import replay
+import textcache
+from engine import APPLE, PEAR, BLUEBERRY, ORANGE, WALL, BITE, WIN
 
 ##
 ## Game customization.
@@ -36,10 +55,9 @@ WIDTH, HEIGHT = 650, 650     # Game screen dimensions.
 
 GRID_SIZE = 50               # Square grid size.
 
-APPLE     = 0  # Apple is the default fruit (type 0)
-PEAR      = 1  # Pear is fruit type 1
-BLUEBERRY = 2  # Blueberry is fruit type 2
-ORANGE    = 3  # Orange is fruit type 3
+GRID_SIZE_MIN, GRID_SIZE_MAX = 1, 100    # Grid sizes the player can choose.
+
+SMALL_CELL_SIZE = 6          # Smaller cells are drawn from a cell buffer, with no grid lines.
 
 HEAD_COLOR      = "#00aa00"  # Color of the snake's head.
 DEAD_HEAD_COLOR = "#4b0082"  # Color of the dead snake's head.
@@ -55,28 +73,62 @@ MESSAGE_COLOR   = "#808080"  # Color of the game-over message.
 
 WINDOW_TITLE    = ["Sucury","Sucury"] # Window title.
 
-CLOCK_TICKS     = 7         # How fast the snake moves.
+CLOSING_KEYS = [ pygame.K_q, pygame.K_END, pygame.K_ESCAPE ]
+
+MENU_FPS = 30               # Maximum redraw rate of the main menu.
 
-START_POS_PADDING = 3       # Size of padding so that the snake does not start to close to the border.
+PLAY_FPS = 60               # Frame rate of the game (input and drawing).
 
-CLOSING_KEYS = [ pygame.K_q, pygame.K_END, pygame.K_ESCAPE ]
+MAX_MOVES_PER_FRAME = 4     # Moves to catch up in one frame before giving up.
+
+INTERPOLATE_HEAD = False    # Slide the head smoothly between cells.
+
+RENDER_BACKEND = "surface"  # How frames are drawn: surface (blits), texture or software (SDL renderer; see backend.py).
+
+RECORD_REPLAYS = True       # Save each game, to be watched or verified (see replay.py).
+
+REPLAY_FILE = "last_game.sucr"   # Where the last game is saved.
+
+HIGH_SCORES_FILE = "highscores.sav"  # Where the best scores are kept.
+
+PROFILE_FILE = "frame_profile.json"  # Where frame timings are saved on exit, if profiled (.json or .csv).
+
+PROFILE_HUD_REFRESH = 500   # How often the profiler overlay is updated (ms).
+
+MENU_IDLE_TIMEOUT = 1000    # How long the idle menu sleeps waiting for input (ms).
+
+AUTOPILOT_RESTART_DELAY = 2000   # How long the autopilot shows the game over (ms).
+
+REPLAY_END_DELAY = 2000     # How long the game over is shown at the end of a replay (ms).
+
+ANALYTICS_DIR = "analytics"  # Where gameplay events are logged (None: not logged; see analytics.py).
 
 ##
 ## Game implementation.
 ##
 
-pygame.init()
-
 clock = pygame.time.Clock()
 
-SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+FONT_FILE            = "assets/font/prstart.ttf"
+COLOR_MENU_FONT_FILE = "assets/font/GochiHand.ttf"
+BACKGROUND_FILE      = "assets/Background.jpg"
+PLAY_BUTTON_FILE     = "assets/Play Rect.png"
+QUIT_BUTTON_FILE     = "assets/Quit Rect.png"
 
-BIG_FONT   = pygame.font.Font("assets/font/prstart.ttf", int(WIDTH/10))
-SMALL_FONT = pygame.font.Font("assets/font/prstart.ttf", int(WIDTH/20))
-COLOR_MENU_FONT = pygame.font.Font("assets/font/GochiHand.ttf", int(WIDTH/20))
+# Images, fonts and music, loaded in the background (see assets.py).
+ASSETS = assets.Assets()
 
-pygame.display.set_caption(WINDOW_TITLE[0])
-BG = pygame.image.load("assets/Background.jpg")
+# The window and the fonts (set by init()).
+SCREEN = None
+BIG_FONT = SMALL_FONT = COLOR_MENU_FONT = HUD_FONT = None
+
+# With a texture backend (see backend.py), the game is drawn through an SDL
+# renderer, in a window of its own, and SCREEN is only an offscreen copy of
+# the frame (read back for the capture). CANVAS is what the scenes draw on:
+# BACKEND if there is one, else SCREEN.
+BACKENDS = ("surface", "texture", "software")
+BACKEND = None
+CANVAS = None
 
 MUSIC_ON = True
 MUSIC_FILES = {
@@ -84,286 +136,286 @@ MUSIC_FILES = {
     'GAMEPLAY': 'assets/music/gameplay.mp3',
 }
 MUTE_KEY = pygame.K_m
+PROFILE_KEY = pygame.K_F3
 
-def main_menu():  # Main Menu Screen
-    global MUSIC_ON
-
-    pygame.display.set_caption(WINDOW_TITLE[1])
-    menu_option = 0  # 0: Play, 1: Quit
-
-    PLAY_BUTTON = Button(image=pygame.image.load("assets/Play Rect.png"), pos=(WIDTH/2, HEIGHT/2.5),
-                         text_input="PLAY", font=SMALL_FONT, base_color="#d7fcd4", hovering_color="White")
-    QUIT_BUTTON = Button(image=pygame.image.load("assets/Quit Rect.png"), pos=(WIDTH/2, HEIGHT/1.8),
-                         text_input="QUIT", font=SMALL_FONT, base_color="#d7fcd4", hovering_color="White")
-
-    buttons = [PLAY_BUTTON, QUIT_BUTTON]
+# The best scores ever (read from disk on first use).
+HIGH_SCORES = highscores.HighScores(HIGH_SCORES_FILE)
 
-    pygame.mixer_music.load(MUSIC_FILES['MENU'])
-    pygame.mixer_music.play(loops=-1)
+# Frame timings, per phase (off until PROFILE_KEY is pressed).
+PROFILER = profiler.Profiler()
 
-    while True:
-        SCREEN.blit(BG, (0, 0))
-        MENU_MOUSE_POS = pygame.mouse.get_pos()
+# Frame capture (see capture.py), if the frames are being recorded.
+CAPTURE = None
 
-        MENU_TEXT = BIG_FONT.render("MENU", True, "#b68f40")
-        MENU_RECT = MENU_TEXT.get_rect(center=(WIDTH/2, HEIGHT/5))
-        SCREEN.blit(MENU_TEXT, MENU_RECT)
-
-        for i, button in enumerate(buttons):
-            if i == menu_option:
-                button.text = button.font.render(button.text_input, True, button.hovering_color)
-            else:
-                button.text = button.font.render(button.text_input, True, button.base_color)
-
-            button.update(SCREEN)
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key in CLOSING_KEYS):
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if buttons[menu_option].checkForInput(MENU_MOUSE_POS):
-                    if menu_option == 0:
-                        play()
-                    elif menu_option == 1:
-                        pygame.quit()
-                        sys.exit()
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP or event.key == pygame.K_DOWN:
-                    menu_option = 1 - menu_option  # Toggle between 0 and 1
-                elif event.key == MUTE_KEY:  # Mute key [m]
-                    if MUSIC_ON:
-                        pygame.mixer_music.stop()
-                    else:
-                        pygame.mixer_music.play()
-                    MUSIC_ON = not MUSIC_ON
-                elif event.key == pygame.K_RETURN:  # Enter key
-                    if menu_option == 0:
-                        play()
-                    elif menu_option == 1:
-                        pygame.quit()
-                        sys.exit()
+##
+## Gameplay events (see analytics.py).
+##
 
+EVENTS = analytics.EventBus()
+
+SESSION_ID = f"{random.getrandbits(64):016x}"
+SESSION_BEST = 0            # Best score of the session (player games).
+SESSION_GAMES = 0           # Games started in the session.
+
+def emit(kind, **fields):
+    EVENTS.emit(kind, session=SESSION_ID, **fields)
+
+# Report how a game ended (the engine event).
+
+def game_ended(game, event, player):
+    global SESSION_BEST
+
+    if event == WIN:
+        emit("win", score=game.score, tick=game.tick)
+    else:
+        emit("death", cause="wall" if event == WALL else "bite", score=game.score, tick=game.tick)
+    if player and game.score > SESSION_BEST:
+        SESSION_BEST = game.score
+        emit("best_score", score=game.score)
+
+# Open the window and start loading the assets. Nothing waits for the
+# files but the fonts (a few KB, needed by the first frame); the background
+# and the music show up as soon as they are loaded.
+
+def init():
+    global BIG_FONT, SMALL_FONT, COLOR_MENU_FONT, HUD_FONT
+
+    pygame.init()
+    open_display(RENDER_BACKEND)
+
+    fonts = [("font", FONT_FILE, int(WIDTH/10)), ("font", FONT_FILE, int(WIDTH/20)),
+             ("font", COLOR_MENU_FONT_FILE, int(WIDTH/20)), ("font", FONT_FILE, int(WIDTH/80))]
+    ASSETS.preload(*fonts)
+    ASSETS.preload(("image", PLAY_BUTTON_FILE), ("image", QUIT_BUTTON_FILE), ("image", BACKGROUND_FILE))
+    ASSETS.preload(*(("data", path) for path in MUSIC_FILES.values()))
+
+    BIG_FONT, SMALL_FONT, COLOR_MENU_FONT, HUD_FONT = (ASSETS.get(key) for key in fonts)
+
+# Open the window (again, if the backend or the size changed), drawn with
+# the given backend (one of BACKENDS).
+
+def open_display(name):
+    global SCREEN, BACKEND, CANVAS
+
+    if BACKEND:
+        BACKEND.close()
+    if name == "surface":
+        BACKEND = None
+        SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+    else:
+        if pygame.display.get_surface():      # Close the display window.
+            pygame.display.quit()
+            pygame.display.init()
+        BACKEND = backend.TextureBackend(WINDOW_TITLE[0], (WIDTH, HEIGHT), accelerated=name == "texture")
+        SCREEN = pygame.Surface((WIDTH, HEIGHT), depth=32)
+    CANVAS = BACKEND or SCREEN
+    set_caption(WINDOW_TITLE[0])
+
+def set_caption(title):
+    if BACKEND:
+        BACKEND.set_caption(title)
+    else:
+        pygame.display.set_caption(title)
+
+# Show the frame drawn on the CANVAS (only the given rects of it, if
+# possible).
+
+def present(rects=None):
+    if BACKEND:
+        if CAPTURE:
+            BACKEND.read_back(SCREEN)       # What capture.grab() takes.
+        BACKEND.present()
+    elif rects is None:
         pygame.display.update()
+    else:
+        pygame.display.update(rects)
 
-## This function is called when the snake dies.
-
-def center_prompt(title, subtitle):
-
-    # Show title and subtitle.
+# A new surface in the pixel format of the display, to be blitted quickly
+# onto it (any format will do for a texture backend).
 
-    center_title = BIG_FONT.render(title, True, MESSAGE_COLOR)
-    center_title_rect = center_title.get_rect(center=(WIDTH/2, HEIGHT/2))
-    SCREEN.blit(center_title, center_title_rect)
+def display_surface(size):
+    surface = pygame.Surface(size)
+    return surface.convert() if pygame.display.get_surface() else surface
 
-    center_subtitle = SMALL_FONT.render(subtitle, True, MESSAGE_COLOR)
-    center_subtitle_rect = center_subtitle.get_rect(center=(WIDTH/2, HEIGHT*2/3))
-    SCREEN.blit(center_subtitle, center_subtitle_rect)
+# The menu background, if it is loaded (else None).
 
-    pygame.display.update()
+def background():
+    key = ("image", BACKGROUND_FILE)
+    return ASSETS.get(key) if ASSETS.ready(key) else None
 
-   # Wait for a keypress or a game quit event.
+MUSIC_TRACK = None          # The track currently loaded.
+MUSIC_WANTED = None         # The track that should be playing (it may still be loading).
 
-    while ( event := pygame.event.wait() ):
-        if event.type == pygame.KEYDOWN:
-            break
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            sys.exit()
-    if event.key in CLOSING_KEYS:          # 'Q' quits game
-        main_menu()
+# Switch to a music track (if it is not already the one loaded). A track
+# still loading starts once it is loaded (see asset_loaded()).
 
-class Snake:
-    def __init__(self):
+def play_music(track):
+    global MUSIC_TRACK, MUSIC_WANTED
 
-        # Calculating range of possible start positions for the snake.
+    MUSIC_WANTED = track
+    key = ("data", MUSIC_FILES[track])
+    if track != MUSIC_TRACK and ASSETS.ready(key):
+        # The track is streamed from memory, not read again from disk.
+        pygame.mixer_music.load(io.BytesIO(ASSETS.get(key)), "mp3")
+        MUSIC_TRACK = track
+        if MUSIC_ON:
+            pygame.mixer_music.play(loops=-1)
 
-        max_x, max_y = (WIDTH/GRID_SIZE)-START_POS_PADDING, (HEIGHT/GRID_SIZE)-START_POS_PADDING
-        min_x, min_y = START_POS_PADDING, START_POS_PADDING
+# Called when an asset finished loading (an assets.ASSET_LOADED event).
 
-        # Dimension of each snake segment times a random position in range.
+def asset_loaded():
+    if MUSIC_WANTED != MUSIC_TRACK:
+        play_music(MUSIC_WANTED)
 
-        self.x, self.y = random.randint(min_x, max_x)*GRID_SIZE, random.randint(min_y, max_y)*GRID_SIZE
+# Mute or unmute the music [m].
 
-        # Initial direction
-        # xmov :  -1 left,    0 still,   1 right
-        # ymov :  -1 up       0 still,   1 dows
+def toggle_music():
+    global MUSIC_ON
 
-        if self.x > WIDTH/2:    # If the snake starts at the right side of the screen, it goes left.
-            self.xmov = -1
-            self.ymov = 0
-        else:                   # Otherwise, it goes right
-            self.xmov = 1
-            self.ymov = 0
+    if MUSIC_TRACK is not None:
+        if MUSIC_ON:
+            pygame.mixer_music.stop()
+        else:
+            pygame.mixer_music.play(loops=-1)
+    MUSIC_ON = not MUSIC_ON
 
-        # The snake has a head segement,
-        self.head = pygame.Rect(self.x, self.y, GRID_SIZE, GRID_SIZE)
+##
+## The snake class.
+##
 
-        # and a tail (array of segments).
-        self.tail = []
+# The rules live in engine.py; this class only adds what is needed to show
+# the snake on the SCREEN (its colors and the pixel rectangles).
 
-        # The should grow or not on the next update
-        self.should_grow = False
+class Snake:
+    def __init__(self, game):
 
-        # The snake is born.
-        self.alive = True
+        # The game state (cells, not pixels) driven by the engine.
+        self.game = game
 
         # Default snake colors
         self.head_color = HEAD_COLOR
         self.tail_color = TAIL_COLOR
 
-        # initialize the movement queue
-        self.movement_queue = []
-        
-    # This function is called at each loop interation.
+        # Takes note of the turns made, if replays are recorded.
+        self.recorder = None
 
-    def update(self):
-        global fruit
-
-        # Check for border crash.
-        if self.head.x not in range(0, WIDTH) or self.head.y not in range(0, HEIGHT):
-            self.alive = False
-
-        # Check for self-bite.
-        for square in self.tail:
-            if self.head.x == square.x and self.head.y == square.y:
-                self.alive = False
-
-        # In the event of death, reset the game SCREEN.
-        if not self.alive:
+    # Start a new game with a fresh seed (and a fresh recording).
 
-            # Tell the bad news
-            pygame.draw.rect(SCREEN, DEAD_HEAD_COLOR, self.head)
+    def respawn(self):
+        seed = random.getrandbits(64)
+        engine.reset(self.game, seed)
+        if RECORD_REPLAYS:
+            self.recorder = replay.Recorder(self.game, seed)
 
-            center_prompt("Game Over", "Press to restart")
+    # This function is called at each loop interation. Returns the engine event.
 
-            # Respan the head
-            max_x, max_y = (WIDTH/GRID_SIZE)-START_POS_PADDING, (HEIGHT/GRID_SIZE)-START_POS_PADDING
-            min_x, min_y = START_POS_PADDING, START_POS_PADDING
-            self.x, self.y = random.randint(min_x, max_x)*GRID_SIZE, random.randint(min_y, max_y)*GRID_SIZE
+    def update(self):
+        if self.recorder:
+            return self.recorder.step(self.game)[1]
+        return engine.step(self.game)[1]
 
-            self.head = pygame.Rect(self.x, self.y, GRID_SIZE, GRID_SIZE)
+    # Save the recording of the current game.
 
-            # Respan the initial tail
-            self.tail = []
+    def save_replay(self, path):
+        if self.recorder:
+            try:
+                self.recorder.replay.save(path)
+            except OSError as error:
+                print(f"Could not save the replay: {error}", file=sys.stderr)
 
-            if self.x > WIDTH/2:    # If the snake starts at the right side of the screen, it goes left.
-                self.xmov = -1
-                self.ymov = 0
-            else:                   # Otherwise, it goes right
-                self.xmov = 1
-                self.ymov = 0
+    # Queue a new direction to be taken on one of the next updates.
 
-            # Resurrection
-            self.alive = True
-            self.should_grow = False
+    def update_direction(self, new_direction):
+        engine.steer(self.game, new_direction)
 
-            # Drop a fruit
-            fruit = Fruit(self)
+    def draw(self, surface):
 
+        # Draw the tail
+        for cell in self.game.body:
+            pygame.draw.rect(surface, self.tail_color, cell_rect(self.game, cell))
 
+        # Draw head
+        pygame.draw.rect(surface, self.head_color, cell_rect(self.game, self.game.head))
 
-        # Move the snake.
-        
-        # Check if the movement queue is not empty
-        if self.movement_queue:
-            # Update direction based on the queue
-            self.xmov, self.ymov = self.movement_queue.pop(0)
+##
+## The fruit.
+##
 
-        # If head hasn't moved, tail shouldn't either (otherwise, self-byte).
-        if (self.xmov or self.ymov):
+FRUIT_COLORS = {
+    APPLE:     APPLE_COLOR,
+    PEAR:      PEAR_COLOR,
+    BLUEBERRY: BLUEBERRY_COLOR,
+    ORANGE:    ORANGE_COLOR,
+}
 
-            # Prepend a new segment to tail.
-            self.tail.insert(0,pygame.Rect(self.head.x, self.head.y, GRID_SIZE, GRID_SIZE))
+def draw_fruit(surface, game):
+    if game.fruit is not None:
+        pygame.draw.rect(surface, FRUIT_COLORS[game.fruit_type], cell_rect(game, game.fruit))
 
-            # If the snake should grow, keeps the last segment, else removes it.
-            if self.should_grow:
-                self.should_grow = False
-            else:
-                self.tail.pop()
+# Screen rectangle covering a grid cell. Rects are only built here, when
+# something is drawn; the engine itself works with packed cell indices.
 
-            # Move the head along current direction.
-            self.head.x += self.xmov * GRID_SIZE
-            self.head.y += self.ymov * GRID_SIZE
+def cell_rect(game, cell):
+    x, y = engine.cell_xy(game, cell)
+    return pygame.Rect(x*GRID_SIZE, y*GRID_SIZE, GRID_SIZE, GRID_SIZE)
 
-            
-  # Sets that the snake should grow on the next update.
-    def update_direction(self, new_direction):
-        # Add new direction to the queue
-        self.movement_queue.append(new_direction)
-        # Limit the size of the queue to prevent too much lag
-        if len(self.movement_queue) > 2:
-            self.movement_queue = self.movement_queue[-2:]
+# Board dimensions, in cells. A partial cell at the right/bottom edge still
+# counts as part of the arena.
 
-    def grow(self):
-        self.should_grow = True
+def board_size():
+    return -(-WIDTH // GRID_SIZE), -(-HEIGHT // GRID_SIZE)
 
 ##
-## The fruit class.
+## The color picker class.
 ##
 
-class Fruit:
+# The colors the pickers offer: HUE_COLORS[hue] for hues 0..360, at full
+# saturation and half lightness. Computed once; picking a color is a lookup.
 
-    def __init__(self, snake):
-        # Pick a random position within the game SCREEN
-        self.x = int(random.randint(0, WIDTH)/GRID_SIZE) * GRID_SIZE
-        self.y = int(random.randint(0, HEIGHT)/GRID_SIZE) * GRID_SIZE
-        self.type = random.randint(0, 3)
+def hue_color(hue):
+    color = pygame.Color(0)
+    color.hsla = (hue, 100, 50, 100)
+    return color
 
-        while True: # Keep generating until it's a valid position
+HUE_COLORS = [hue_color(hue) for hue in range(361)]
+HUE_RGB = np.array([(color.r, color.g, color.b) for color in HUE_COLORS], dtype=np.uint8)
 
-            if (self.x,self.y) == (snake.head.x,snake.head.y): # If it's on top of snake head
-                self.x = int(random.randint(0, WIDTH)/GRID_SIZE) * GRID_SIZE
-                self.y = int(random.randint(0, HEIGHT)/GRID_SIZE) * GRID_SIZE
-                continue
-            for segment in snake.tail: # check if it's on top of snake body
-                if (self.x,self.y) == (segment.x,segment.y): 
-                    self.x = int(random.randint(0, WIDTH)/GRID_SIZE) * GRID_SIZE
-                    self.y = int(random.randint(0, HEIGHT)/GRID_SIZE) * GRID_SIZE
-                    break
-            else:
-                break
-
-        # Create a fruit at that location
-        self.rect = pygame.Rect(self.x, self.y, GRID_SIZE, GRID_SIZE)
+# The picker image (the hue strip over the ground), by (width, height). It
+# never changes, so pickers of the same size share it.
 
-    def update(self, CLOCK_TICKS=6):
+GRADIENTS = {}
 
-        # Drop the fruit
-        if self.type == APPLE:
-            pygame.draw.rect(SCREEN, APPLE_COLOR, self.rect)
+def hue_gradient(width, height):
+    key = (width, height)
+    if key not in GRADIENTS:
+        rad = height // 2
+        pwidth = width - rad*2
+        top, strip_height = height // 3, height - 2*height//3
 
-        elif self.type == PEAR:
-            pygame.draw.rect(SCREEN, PEAR_COLOR, self.rect)
-          
-        elif self.type == BLUEBERRY:
-            pygame.draw.rect(SCREEN, BLUEBERRY_COLOR, self.rect)
+        image = display_surface((width, height))
+        image.fill(SCREEN_COLOR)
 
-        elif self.type == ORANGE:
-            pygame.draw.rect(SCREEN, ORANGE_COLOR, self.rect)
+        # Pixel column i shows hue 360*i/pwidth: all columns in one go.
+        pixels = pygame.surfarray.pixels3d(image)
+        pixels[rad:rad + pwidth, top:top + strip_height] = HUE_RGB[360 * np.arange(pwidth) // pwidth][:, np.newaxis]
+        del pixels     # Unlock the surface.
 
-##
-## The color picker class.
-##
+        GRADIENTS[key] = image
+    return GRADIENTS[key]
 
 class ColorPicker:
     def __init__(self, center, width, height):
         x, y = center 
         self.rect = pygame.Rect(x, y, width, height)
-        self.image = pygame.Surface((width, height))
-        self.image.fill(SCREEN_COLOR)
+        self.image = hue_gradient(width, height)
         self.rad = height // 2
         self.pwidth = width - self.rad*2
-        for i in range(self.pwidth):    # Filling gradient
-            color = pygame.Color(0)
-            color.hsla = (int(360*i/self.pwidth), 100, 50, 100)
-            pygame.draw.rect(self.image, color, (i + self.rad, height // 3, 1, height - 2*height//3))
         self.pos = 0
 
+    # The color under the knob (the same the strip shows there).
+
     def get_color(self):
-        color = pygame.Color(0)
-        color.hsla = (int(self.pos * self.pwidth), 100, 50, 100)
-        return color
+        return HUE_COLORS[int(360 * self.pos)]
 
     def update(self):
         mouse_buttons = pygame.mouse.get_pressed()
@@ -375,215 +427,1035 @@ class ColorPicker:
     def draw(self, surf):
         surf.blit(self.image, self.rect)
         center = self.rect.left + self.rad + self.pos * self.pwidth, self.rect.centery
-        pygame.draw.circle(surf, self.get_color(), center, self.rect.height // 4)
+        if surf is BACKEND:
+            BACKEND.circle(self.get_color(), center, self.rect.height // 4)
+        else:
+            pygame.draw.circle(surf, self.get_color(), center, self.rect.height // 4)
 
 ##
 ## Draw the SCREEN
 ##
 
-def draw_grid():
-    for x in range(0, WIDTH, GRID_SIZE):
-        for y in range(0, HEIGHT, GRID_SIZE):
-            rect = pygame.Rect(x, y, GRID_SIZE, GRID_SIZE)
-            pygame.draw.rect(SCREEN, GRID_COLOR, rect, 1)
-
+# The ground and the grid lines never change during a game, so they are
+# drawn once into a surface that is blitted (whole or in pieces) afterwards.
+# It is rebuilt only if the grid size changes.
 
-def grid_resize():
-    global grid_size
-    # Show title and subtitle.
-    center_title = BIG_FONT.render("Welcome", True, MESSAGE_COLOR)
-    center_title_rect = center_title.get_rect(center=(WIDTH/2, HEIGHT/2))
+GRID_SURFACE = None
+GRID_SURFACE_KEY = None
 
-    center_subtitle = SMALL_FONT.render("Press to Start.", True, MESSAGE_COLOR)
-    center_subtitle_rect = center_subtitle.get_rect(center=(WIDTH/2, HEIGHT*2/3))
-    
-    grid_size_text = SMALL_FONT.render(f"Grid Size Up Down: {grid_size}", True, MESSAGE_COLOR)
-    grid_size_text_rect = grid_size_text.get_rect(center=(WIDTH/2, HEIGHT*3/4 + 20))
-
-    while ( event := pygame.event.wait() ):
-        if event.type == pygame.KEYDOWN:
-            # Change grid size.
-            if event.key == pygame.K_UP:
-                grid_size += 1
-                if grid_size >= 100: grid_size = 100  # Limit grid size up to 100px.
-            elif event.key == pygame.K_DOWN:
-                grid_size -= 1
-                if grid_size <= 10: grid_size = 10 # Limit grid size down to 10px.
-            else:   # Exit if other keys are pressed. 
-                break
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            sys.exit()
+def grid_background():
+    global GRID_SURFACE, GRID_SURFACE_KEY
 
+    key = (WIDTH, HEIGHT, GRID_SIZE)
+    if GRID_SURFACE_KEY != key:
+        GRID_SURFACE = display_surface((WIDTH, HEIGHT))
+        GRID_SURFACE.fill(SCREEN_COLOR)
+        if GRID_SIZE >= SMALL_CELL_SIZE:      # Tiny cells would be all lines.
+            for x in range(0, WIDTH, GRID_SIZE):
+                for y in range(0, HEIGHT, GRID_SIZE):
+                    rect = pygame.Rect(x, y, GRID_SIZE, GRID_SIZE)
+                    pygame.draw.rect(GRID_SURFACE, GRID_COLOR, rect, 1)
+        GRID_SURFACE_KEY = key
+    return GRID_SURFACE
 
-        grid_size_text = SMALL_FONT.render(f"Grid Size Up Down: {grid_size}", True, MESSAGE_COLOR)
-        SCREEN.fill(SCREEN_COLOR)
+def draw_grid():
+    CANVAS.blit(grid_background(), (0, 0))
+
+# Repaint a region of the arena: put the ground back and draw again the
+# snake segments and the fruit lying in it. Only the cells touching the
+# region are visited, whatever the snake length.
+
+def restore_region(surface, snake, rect):
+    game = snake.game
+    surface.blit(grid_background(), rect, rect)
+
+    left, top = max(rect.left // GRID_SIZE, 0), max(rect.top // GRID_SIZE, 0)
+    right = min((rect.right - 1) // GRID_SIZE, game.cols - 1)
+    bottom = min((rect.bottom - 1) // GRID_SIZE, game.rows - 1)
+
+    clip = surface.get_clip()
+    surface.set_clip(rect)
+    for y in range(top, bottom + 1):
+        for x in range(left, right + 1):
+            cell = engine.xy_cell(game, x, y)
+            if cell == game.head:
+                color = snake.head_color
+            elif game.occupied[cell]:
+                color = snake.tail_color
+            elif cell == game.fruit:
+                color = FRUIT_COLORS[game.fruit_type]
+            else:
+                continue
+            pygame.draw.rect(surface, color, cell_rect(game, cell))
+    surface.set_clip(clip)
 
-        draw_grid()
 
+##
+## Large boards
+##
 
-        SCREEN.blit(center_title, center_title_rect)
-        SCREEN.blit(center_subtitle, center_subtitle_rect)
-        SCREEN.blit(grid_size_text, grid_size_text_rect)
+# With cells of a few pixels, boards get huge (650x650 cells with 1-pixel
+# cells) and snakes very long, so drawing cell by cell is out of the
+# question. The arena is kept instead in a buffer holding one pixel per
+# cell: each move changes a few of its pixels, and every frame the buffer
+# is scaled up to the window in one go. The cost of a frame depends on the
+# window size, not on the snake length.
+#
+# A texture backend draws the snake and the fruit of any board that way (a
+# single texture, scaled by the renderer). Over grid lines, the empty cells
+# of the buffer are left transparent (blending costs more, though).
+
+class CellBuffer:
+    def __init__(self, game, transparent=False):
+        self.game = game
+        cols, rows = game.cols, game.rows
+
+        # 32-bit, so that its pixels can be written as an array.
+        self.transparent = transparent
+        if transparent:
+            self.surface = pygame.Surface((cols, rows), pygame.SRCALPHA)
+            self.ground = (0, 0, 0, 0)
+        else:
+            self.surface = pygame.Surface((cols, rows), depth=32)
+            self.ground = SCREEN_COLOR
+        self.arena = None           # The buffer scaled up (made on the first draw()).
+
+    # Paint every cell (the snake in one pass over the occupancy grid).
+
+    def redraw(self, snake):
+        game, surface = self.game, self.surface
+        occupied = np.frombuffer(game.occupied, dtype=np.uint8).reshape(game.rows, game.cols).T
+
+        pixels = pygame.surfarray.pixels2d(surface)
+        body, ground = (surface.map_rgb(pygame.Color(color)) for color in (snake.tail_color, self.ground))
+        pixels[:] = np.where(occupied, body, ground)
+        del pixels     # Unlock the surface.
+
+        self.update(snake, (game.head, game.fruit))
+
+    # Paint the given cells again.
+
+    def update(self, snake, cells):
+        game, surface = self.game, self.surface
+        for cell in cells:
+            if cell is None:
+                continue
+            if cell == game.head:
+                color = snake.head_color
+            elif game.occupied[cell]:
+                color = snake.tail_color
+            elif cell == game.fruit:
+                color = FRUIT_COLORS[game.fruit_type]
+            else:
+                color = self.ground
+            surface.set_at(engine.cell_xy(game, cell), color)
 
-        pygame.display.update()
+    def draw(self, target):
+        if self.arena is None:
+            self.arena = pygame.Surface((self.game.cols*GRID_SIZE, self.game.rows*GRID_SIZE), depth=32)
+        pygame.transform.scale(self.surface, self.arena.get_size(), self.arena)
+        target.blit(self.arena, (0, 0))
 
 ##
 ## Draw the color menu
 ##
 
 def draw_color_menu(menu_text, color_picker, center):
-    global SCREEN
 
     # Rendering text
-    menu = COLOR_MENU_FONT.render(menu_text, True, SCORE_COLOR)
+    menu = textcache.render(COLOR_MENU_FONT, menu_text, True, SCORE_COLOR)
     menu_rect = menu.get_rect(center=center)
-    pygame.draw.rect(SCREEN, SCREEN_COLOR, menu_rect)
-    SCREEN.blit(menu, menu_rect)
+    CANVAS.fill(SCREEN_COLOR, menu_rect)
+    CANVAS.blit(menu, menu_rect)
 
     # Rendering color picker
     color_picker.update()
-    color_picker.draw(SCREEN)
+    color_picker.draw(CANVAS)
+
+##
+## Scenes
+##
+
+# The game is a set of scenes (menu, grid setup, play, game over) run by a
+# single loop. Each scene draws and handles one frame at a time and tells
+# which scene comes next, so that going back and forth between the menu and
+# the game does not pile up function calls (nor keep old games in memory).
+
+class Scene:
+
+    # Called when the scene becomes the current one.
+    def enter(self):
+        pass
+
+    # Run one frame. Returns the next scene: self to stay, None to quit.
+    def frame(self):
+        return self
+
+    # Called when the scene is left: release what enter() acquired.
+    def exit(self):
+        pass
+
+def run(scene):
+    scene.enter()
+    while scene is not None:
+        next_scene = scene.frame()
+        if next_scene is not scene:
+            scene.exit()
+            scene = next_scene
+            if scene is not None:
+                scene.enter()
+    pygame.quit()
+
+##
+## Main menu
+##
+
+class MenuScene(Scene):
+
+    def enter(self):
+        set_caption(WINDOW_TITLE[1])
+        self.menu_option = 0  # 0: Play, 1: Autopilot, 2: Quit
+
+        self.buttons = [
+            Button(image=ASSETS.image(PLAY_BUTTON_FILE), pos=(WIDTH/2, HEIGHT/2.8),
+                   text_input="PLAY", font=SMALL_FONT, base_color="#d7fcd4", hovering_color="White"),
+            Button(image=ASSETS.image(PLAY_BUTTON_FILE), pos=(WIDTH/2, HEIGHT/1.85),
+                   text_input="AUTO", font=SMALL_FONT, base_color="#d7fcd4", hovering_color="White"),
+            Button(image=ASSETS.image(QUIT_BUTTON_FILE), pos=(WIDTH/2, HEIGHT/1.38),
+                   text_input="QUIT", font=SMALL_FONT, base_color="#d7fcd4", hovering_color="White"),
+        ]
+
+        play_music('MENU')
+
+        # The menu is only drawn again when something changes on it (a key
+        # was pressed, the mouse hovered another button...). Otherwise it
+        # sleeps waiting for input, instead of spinning a CPU core.
+        self.redraw = True
+
+    def exit(self):
+        self.buttons = None
+
+    # Act on the selected option.
+    def choose(self):
+        if self.menu_option == 0:
+            return GridSetupScene()
+        if self.menu_option == 1:
+            return GridSetupScene(auto=True)
+        return None
+
+    def frame(self):
+        buttons = self.buttons
+
+        if self.redraw:
+            # The background may still be loading: it is drawn when it arrives.
+            image = background()
+            if image:
+                CANVAS.blit(image, (0, 0))
+            else:
+                CANVAS.fill(SCREEN_COLOR)
+
+            MENU_TEXT = textcache.render(BIG_FONT, "MENU", True, "#b68f40")
+            MENU_RECT = MENU_TEXT.get_rect(center=(WIDTH/2, HEIGHT/5))
+            CANVAS.blit(MENU_TEXT, MENU_RECT)
+
+            for i, button in enumerate(buttons):
+                if i == self.menu_option:
+                    button.text = textcache.render(button.font, button.text_input, True, button.hovering_color)
+                else:
+                    button.text = textcache.render(button.font, button.text_input, True, button.base_color)
+
+                button.update(CANVAS)
+
+            present()
+            self.redraw = False
+
+        # Sleep until an event arrives (or the timeout expires), then take
+        # every pending event at once.
+
+        event = pygame.event.wait(MENU_IDLE_TIMEOUT)
+        events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+
+        for event in events:
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key in CLOSING_KEYS):
+                return None
+            if event.type == pygame.MOUSEMOTION:
+                # Hovering a button selects it.
+                for i, button in enumerate(buttons):
+                    if i != self.menu_option and button.checkForInput(event.pos):
+                        self.menu_option = i
+                        self.redraw = True
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if buttons[self.menu_option].checkForInput(event.pos):
+                    return self.choose()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_UP:
+                    self.menu_option = (self.menu_option - 1) % len(buttons)
+                    self.redraw = True
+                elif event.key == pygame.K_DOWN:
+                    self.menu_option = (self.menu_option + 1) % len(buttons)
+                    self.redraw = True
+                elif event.key == MUTE_KEY:  # Mute key [m]
+                    toggle_music()
+                elif event.key == pygame.K_RETURN:  # Enter key
+                    return self.choose()
+            if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                self.redraw = True
+            if event.type == assets.ASSET_LOADED:
+                asset_loaded()
+                self.redraw = True
+
+        # Never redraw faster than the frame-rate cap.
+        clock.tick(MENU_FPS)
+
+        return self
+
+##
+## Grid size setup
+##
+
+class GridSetupScene(Scene):
+
+    # With auto set, the game that follows is played by the autopilot.
+    def __init__(self, auto=False):
+        self.auto = auto
+
+    def enter(self):
+        self.redraw = True
+
+    def frame(self):
+        global GRID_SIZE
+
+        if self.redraw:
+            CANVAS.fill(SCREEN_COLOR)
+            draw_grid()
+
+            # Show title and subtitle.
+            center_title = textcache.render(BIG_FONT, "Welcome", True, MESSAGE_COLOR)
+            CANVAS.blit(center_title, center_title.get_rect(center=(WIDTH/2, HEIGHT/2)))
+
+            center_subtitle = textcache.render(SMALL_FONT, "Press to Start.", True, MESSAGE_COLOR)
+            CANVAS.blit(center_subtitle, center_subtitle.get_rect(center=(WIDTH/2, HEIGHT*2/3)))
+
+            grid_size_text = textcache.render(SMALL_FONT, f"Grid Size Up Down: {GRID_SIZE}", True, MESSAGE_COLOR)
+            CANVAS.blit(grid_size_text, grid_size_text.get_rect(center=(WIDTH/2, HEIGHT*3/4 + 20)))
+
+            present()
+            self.redraw = False
+
+        event = pygame.event.wait(MENU_IDLE_TIMEOUT)
+
+        if event.type == pygame.QUIT:
+            return None
+        if event.type == pygame.KEYDOWN:
+            # Change grid size.
+            if event.key == pygame.K_UP:
+                GRID_SIZE = min(GRID_SIZE + 1, GRID_SIZE_MAX)
+                self.redraw = True
+            elif event.key == pygame.K_DOWN:
+                GRID_SIZE = max(GRID_SIZE - 1, GRID_SIZE_MIN)
+                self.redraw = True
+            elif event.key in CLOSING_KEYS:
+                return MenuScene()
+            else:   # Start if other keys are pressed.
+                return PlayScene(self.auto)
+        if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            self.redraw = True
+
+        return self
 
 ##
 ## Main loop
 ##
-def play(CLOCK_TICKS=7):
-    global MUSIC_ON
 
-    pygame.mixer_music.load(MUSIC_FILES['GAMEPLAY'])
+# A game played back from a replay (see replay.py): the snake takes the
+# recorded turns at the recorded ticks.
 
-    if MUSIC_ON:
-        pygame.mixer_music.play(loops=-1)
+class ReplayPilot:
 
-    game_on = 1
-    show_color_menu = False
+    def __init__(self, recording):
+        self.turns = dict(recording.turns)
 
-    SCREEN.fill("black")
-    
-    draw_grid()
-    
-    score = BIG_FONT.render("1", True, MESSAGE_COLOR)
-    score_rect = score.get_rect(center=(WIDTH/2, HEIGHT/20+HEIGHT/30))
+    def __call__(self, game):
+        return self.turns.get(game.tick)
+
+class PlayScene(Scene):
+
+    # With auto set, the autopilot plays; with a replay, the recorded game
+    # is played back (and the scene ends with it).
+    def __init__(self, auto=False, recording=None):
+        self.recording = recording
+        if recording:
+            self.game = engine.new_game(recording.cols, recording.rows, recording.seed)
+        else:
+            self.game = engine.new_game(*board_size())    # The snake and the fruit
+
+        self.snake = Snake(self.game)    # The snake, as seen on the SCREEN
+        if not recording:
+            self.snake.respawn()
+
+        # Arena of tiny cells (or any arena, with a texture backend), drawn
+        # from a buffer (see CellBuffer).
+        if BACKEND:
+            self.cells = CellBuffer(self.game, transparent=GRID_SIZE >= SMALL_CELL_SIZE)
+        else:
+            self.cells = CellBuffer(self.game) if GRID_SIZE < SMALL_CELL_SIZE else None
+
+        # In autopilot mode, the snake is steered by autopilot.py instead of
+        # the keyboard (its scores do not count as high scores).
+        self.pilot = autopilot.Autopilot(self.game) if auto else None
+        if recording:
+            self.pilot = ReplayPilot(recording)
 
-    snake = Snake()    # The snake
+        self.best_score_num = HIGH_SCORES.best() # Best score so far
 
-    fruit = Fruit(snake)    # A fruit
+        score = textcache.render(BIG_FONT, "1", True, MESSAGE_COLOR)
+        score_rect = score.get_rect(center=(WIDTH/2, HEIGHT/20+HEIGHT/30))
 
-    best_score_num = 0 # Best score in the run
+        best_score = textcache.render(SMALL_FONT, "1", True, MESSAGE_COLOR)
+        best_score_rect = best_score.get_rect(center=(WIDTH/3, HEIGHT/2+HEIGHT/3))
 
-    best_score = SMALL_FONT.render("1", True, MESSAGE_COLOR)
-    best_score_rect = best_score.get_rect(center=(WIDTH/3, HEIGHT/2+HEIGHT/3))
+        # Text shown over the arena: where it goes, and what was last drawn there.
+        self.score_overlay = {"font": BIG_FONT, "pos": score_rect.topleft, "text": None, "rect": score_rect}
+        self.best_score_overlay = {"font": SMALL_FONT, "pos": best_score_rect.topleft, "text": None, "rect": best_score_rect}
 
-    head_color_picker = ColorPicker((WIDTH/4, HEIGHT/3), 400, 60)
-    tail_color_picker = ColorPicker((WIDTH/4, HEIGHT/1.7), 400, 60)
+        self.head_color_picker = ColorPicker((WIDTH/4, HEIGHT/3), 400, 60)
+        self.tail_color_picker = ColorPicker((WIDTH/4, HEIGHT/1.7), 400, 60)
 
-    #center_prompt("Welcome", "Press to start")
+        self.game_on = 1
+        self.show_color_menu = False
+        self.started = False        # Whether the start of the game was reported.
 
-    while True:
+    def enter(self):
+        global SESSION_GAMES
+
+        play_music('GAMEPLAY')
+
+        # Coming back from a game over: respawn the snake and drop a fruit.
+        if not self.game.alive:
+            self.snake.respawn()
+            self.started = False
+
+        if not self.started:
+            SESSION_GAMES += 1
+            mode = "replay" if self.recording else "auto" if self.pilot else "play"
+            emit("game_start", mode=mode, cols=self.game.cols, rows=self.game.rows)
+            self.started = True
+
+        # The first frame (and any frame after a prompt or a menu) draws the
+        # whole SCREEN; the others draw only what changed.
+        self.full_redraw = True
+
+        # Time not yet spent in moves, and time elapsed since the last frame
+        # (restart the clock so that the time away is not counted).
+        self.lag = 0
+        self.elapsed = 0
+        clock.tick()
+
+        # Where the interpolated head was drawn on the last frame, if anywhere.
+        self.head_rect = None
+
+        # The profiler overlay (shown while profiling): its text, when it
+        # was rendered and where it was drawn last.
+        self.hud = None
+        self.hud_time = 0
+        self.hud_rect = None
+
+    def frame(self):
+        game, snake = self.game, self.snake
+
+        PROFILER.start()
 
         for event in pygame.event.get():           # Wait for events
 
         # App terminated
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                return None
+
+            if event.type == assets.ASSET_LOADED:
+                asset_loaded()
 
             # Key pressed
             if event.type == pygame.KEYDOWN:
-                if game_on:
+                if self.game_on:
                     new_direction = None
+                    xmov, ymov = game.direction
                     # If player presses S o DOWN_ARROW, moves down
-                    if event.key == pygame.K_DOWN or event.key == pygame.K_s and snake.ymov == 0:  # Down arrow: move down
+                    if event.key == pygame.K_DOWN or event.key == pygame.K_s and ymov == 0:  # Down arrow: move down
                         new_direction = (0, 1)
                     # If player presses W o UP_ARROW, moves up
-                    elif event.key == pygame.K_UP or event.key == pygame.K_w and snake.ymov == 0:  # Up arrow: move up
+                    elif event.key == pygame.K_UP or event.key == pygame.K_w and ymov == 0:  # Up arrow: move up
                         new_direction = (0, -1)
                     # If player presses D o RIGHT_ARROW, moves right
-                    elif event.key == pygame.K_RIGHT or event.key == pygame.K_d and snake.xmov == 0: # Right arrow: move right
+                    elif event.key == pygame.K_RIGHT or event.key == pygame.K_d and xmov == 0: # Right arrow: move right
                         new_direction = (1, 0)
                     # If player presses A o LEFT_ARROW, moves left
-                    elif event.key == pygame.K_LEFT or event.key == pygame.K_a and snake.xmov == 0:  # Left arrow: move left
+                    elif event.key == pygame.K_LEFT or event.key == pygame.K_a and xmov == 0:  # Left arrow: move left
                         new_direction = (-1, 0)
                     elif event.key == MUTE_KEY:  # If player presses the mute key [m]
-                        if MUSIC_ON:
-                            pygame.mixer_music.stop()
-                        else:
-                            pygame.mixer_music.play()
-                        MUSIC_ON = not MUSIC_ON
+                        toggle_music()
 
-                    if new_direction:
+                    if new_direction and not self.pilot:
                         # Update the queue with new direction
                         snake.update_direction(new_direction)  
                     
                 if event.key in CLOSING_KEYS:     # [CLOSING_KEYS]         : quit game
-                    main_menu()
+                    return MenuScene()
                 elif event.key == pygame.K_p:     # S         : pause game
-                    game_on = not game_on
-                    if show_color_menu: show_color_menu = False
+                    self.game_on = not self.game_on
+                    if self.show_color_menu: self.show_color_menu = False
+                    self.full_redraw = True
+                    emit("pause", paused=not self.game_on)
                 elif event.key == pygame.K_c:     # C:           show color menu
-                    show_color_menu = not show_color_menu
-                    game_on = False if show_color_menu else True
+                    self.show_color_menu = not self.show_color_menu
+                    self.game_on = False if self.show_color_menu else True
+                    self.full_redraw = True
+                    emit("color_menu", open=self.show_color_menu)
+                elif event.key == PROFILE_KEY:    # F3:          profile frames
+                    PROFILER.toggle()
+                    self.hud = self.hud_rect = None
+                    self.full_redraw = True
 
+        PROFILER.lap("events")
 
         ## Update the game
 
-        if game_on:
-          
-            # If the player gets a new record
-            if(len(snake.tail) > best_score_num):
-                best_score_num = len(snake.tail)
+        # The game logic runs at the snake speed (game.speed moves per
+        # second), whatever the frame rate: the time elapsed since the last
+        # frame is accumulated and spent in fixed-length moves. Input is
+        # polled and the screen drawn on every frame.
+
+        # Cells that may look different after the moves made in this frame.
+        dirty_cells = []
+
+        # The scene that follows if the game ends in this frame.
+        game_over = None
+
+        if self.game_on:
+            self.lag += self.elapsed
+            moves = 0
+
+            while self.lag >= 1000 / game.speed:
+                self.lag -= 1000 / game.speed   # A fruit may change the speed for the next move.
+                moves += 1
+
+                # If the player gets a new record
+                if(game.score > self.best_score_num):
+                    self.best_score_num = game.score
+
+                # Move the snake. Eating fruit (and its effects) is handled by the engine.
+
+                dirty_cells += [game.head, engine.tail_end(game), game.fruit]
+
+                if self.pilot:
+                    new_direction = self.pilot(game)
+                    if new_direction:
+                        snake.update_direction(new_direction)
+
+                speed = game.speed
+                event = snake.update()
+
+                if event in (engine.ATE, WIN):
+                    emit("fruit", fruit=analytics.FRUIT_NAMES[game.eaten], score=game.score, tick=game.tick)
+                    if game.speed != speed:
+                        emit("speed", speed=game.speed, previous=speed)
+
+                # The autopilot starts over by itself after a while.
+                subtitle, timeout = ("Restarting", AUTOPILOT_RESTART_DELAY) if self.pilot else ("Press to restart", None)
+
+                # A replay ends with the game.
+                after = self
+                if self.recording:
+                    subtitle, timeout, after = "End of replay", REPLAY_END_DELAY, None
+
+                if event in (WALL, BITE):
+                    game_over = GameOverScene(after, "Game Over", subtitle, timeout)
+                elif event == WIN:
+                    game_over = GameOverScene(after, "You Win", subtitle, timeout)
+                if game_over:
+                    if not self.pilot:
+                        HIGH_SCORES.add(game.score)
+                    game_ended(game, event, not self.pilot)
+                    snake.save_replay(REPLAY_FILE)
+                    self.full_redraw = True
+                    break
+
+                dirty_cells += [game.head, game.fruit]
+
+                # If the frames fell far behind (e.g. the window was dragged),
+                # drop the backlog instead of fast-forwarding the snake.
+                if moves == MAX_MOVES_PER_FRAME:
+                    self.lag = 0
+
+        PROFILER.lap("update")
+
+        # While the color menu is open, everything is drawn again (the
+        # colors may change at any time).
+
+        if self.show_color_menu:
+            self.full_redraw = True
+
+        if BACKEND:
+            return self.render(dirty_cells, game_over, event if game_over else None)
 
-            snake.update()
+        ## Draw the game
 
-            SCREEN.fill(SCREEN_COLOR)
+        if self.cells:
+
+            # Update the cell buffer and scale it over the whole arena (so
+            # the rest of the SCREEN is drawn again too).
+            if self.full_redraw:
+                draw_grid()                  # The margins past the last cells.
+                self.cells.redraw(snake)
+            else:
+                self.cells.update(snake, dirty_cells)
+            self.cells.draw(SCREEN)
+            self.full_redraw = True
+            dirty_rects = []
+        elif self.full_redraw:
+
+            # Draw the whole arena
+            draw_grid()
+            draw_fruit(SCREEN, game)
+            snake.draw(SCREEN)
+            dirty_rects = []
+        else:
+
+            # Draw only the cells that changed
+            dirty_rects = [cell_rect(game, cell) for cell in set(dirty_cells) if cell is not None]
+
+            # The head sliding towards the next cell covers both cells (and
+            # whatever it covered on the previous frame).
+            if self.head_rect:
+                dirty_rects.append(self.head_rect)
+                self.head_rect = None
+            if INTERPOLATE_HEAD and self.game_on and not game_over:
+                self.head_rect = self.interpolated_head()
+                dirty_rects.append(self.head_rect.union(cell_rect(game, game.head)))
+
+            for rect in dirty_rects:
+                restore_region(SCREEN, snake, rect)
+
+            if self.head_rect:
+                pygame.draw.rect(SCREEN, snake.head_color, self.head_rect)
+
+        PROFILER.lap("draw")
+
+        # Show score (snake length = head + tail) and the best score in the
+        # run until the end of the current game. The text is drawn again
+        # only if it changed or if a changed cell was drawn over it.
+
+        for overlay, text in ((self.score_overlay, f"{game.score}"),
+                              (self.best_score_overlay, f"Best score: {self.best_score_num}")):
+            if self.full_redraw or text != overlay["text"] or overlay["rect"].collidelist(dirty_rects) != -1:
+                surface = textcache.render(overlay["font"], text, True, SCORE_COLOR)
+                rect = surface.get_rect(topleft=overlay["pos"])
+                area = rect.union(overlay["rect"])
+                if not self.full_redraw:
+                    restore_region(SCREEN, snake, area)
+                SCREEN.blit(surface, rect)
+                dirty_rects.append(area)
+                overlay["text"], overlay["rect"] = text, rect
+
+        PROFILER.lap("text")
+
+        if game_over:
+
+            # Tell the bad news (the game over scene shows the prompt)
+            if event in (WALL, BITE):
+                pygame.draw.rect(SCREEN, DEAD_HEAD_COLOR, cell_rect(game, game.head))
+
+            return game_over
+
+        if self.show_color_menu:
+            draw_color_menu("HEAD COLOR", self.head_color_picker, (WIDTH/2, HEIGHT/3 - 60))
+            snake.head_color = self.head_color_picker.get_color()
+
+            draw_color_menu("TAIL COLOR", self.tail_color_picker, (WIDTH/2, HEIGHT/1.7 - 60))
+            snake.tail_color = self.tail_color_picker.get_color()
+
+            PROFILER.lap("color_menu")
+
+        if PROFILER.enabled:
+            self.draw_hud(dirty_rects)
+            PROFILER.lap("hud")
+
+        # Update display (only the changed areas, if possible) and move clock.
+        if self.full_redraw:
+            present()
+            self.full_redraw = False
+        elif dirty_rects:
+            present(dirty_rects)
+        PROFILER.lap("display")
+
+        if CAPTURE:
+            CAPTURE.grab(SCREEN)
+            PROFILER.lap("capture")
+
+        self.elapsed = clock.tick(PLAY_FPS)
+        PROFILER.lap("wait")
+
+        return self
+
+    # Draw the frame through the texture backend: the whole of it, every
+    # frame, in a few draw calls (the grid, if it shows through, the cell
+    # buffer with the snake and the fruit, then the text). The board covers
+    # the whole window (see board_size()).
+
+    def render(self, dirty_cells, game_over, event):
+        game, snake = self.game, self.snake
+
+        if self.full_redraw:
+            self.cells.redraw(snake)
+        else:
+            self.cells.update(snake, dirty_cells)
+        if self.full_redraw or dirty_cells:
+            self.cells_texture = BACKEND.stream("cells", self.cells.surface)
+        self.full_redraw = False
+
+        if self.cells.transparent:
             draw_grid()
+        BACKEND.draw(self.cells_texture, (0, 0, game.cols*GRID_SIZE, game.rows*GRID_SIZE))
+        if INTERPOLATE_HEAD and self.game_on and not game_over:
+            BACKEND.fill(snake.head_color, self.interpolated_head())
 
-            fruit.update()
+        PROFILER.lap("draw")
 
-        # Draw the tail
-        for square in snake.tail:
-            pygame.draw.rect(SCREEN, snake.tail_color, square)
+        for overlay, text in ((self.score_overlay, f"{game.score}"),
+                              (self.best_score_overlay, f"Best score: {self.best_score_num}")):
+            BACKEND.blit(textcache.render(overlay["font"], text, True, SCORE_COLOR), overlay["pos"])
 
-        # Draw head
-        pygame.draw.rect(SCREEN, snake.head_color, snake.head)
-
-        # Show score (snake length = head + tail)
-        score = BIG_FONT.render(f"{len(snake.tail)}", True, SCORE_COLOR)
-        SCREEN.blit(score, score_rect)
-        
-        # Show the best score in the run until the end of the current game
-        best_score = SMALL_FONT.render(f"Best score: {best_score_num}", True, SCORE_COLOR)
-        SCREEN.blit(best_score, best_score_rect)
-
-
-        # If the head pass over a fruit, lengthen the snake and drop another fruit
-        if snake.head.x == fruit.x and snake.head.y == fruit.y:
-            snake.grow()
-            
-            # Pear makes snake faster
-            if fruit.type == PEAR:
-                CLOCK_TICKS += 1 if CLOCK_TICKS < 12 else 0
-            # Blueberry makes snake slower
-            elif fruit.type == BLUEBERRY:
-                CLOCK_TICKS -= 1 if CLOCK_TICKS > 2 else 0
-            # Orange increases snake length by 2 instead of 1
-            elif fruit.type == ORANGE:
-                snake.grow()
-                
-            fruit = Fruit(snake)
-
-
-        if show_color_menu:
-            draw_color_menu("HEAD COLOR", head_color_picker, (WIDTH/2, HEIGHT/3 - 60))
-            snake.head_color = head_color_picker.get_color()
-
-            draw_color_menu("TAIL COLOR", tail_color_picker, (WIDTH/2, HEIGHT/1.7 - 60))
-            snake.tail_color = tail_color_picker.get_color()
-
-
-        # Update display and move clock.
-        pygame.display.update()
-        clock.tick(CLOCK_TICKS)
+        PROFILER.lap("text")
+
+        # The game over scene shows its prompt over this frame, and presents it.
+        if game_over:
+            if event in (WALL, BITE):
+                BACKEND.fill(DEAD_HEAD_COLOR, cell_rect(game, game.head))
+            return game_over
+
+        if self.show_color_menu:
+            draw_color_menu("HEAD COLOR", self.head_color_picker, (WIDTH/2, HEIGHT/3 - 60))
+            snake.head_color = self.head_color_picker.get_color()
+
+            draw_color_menu("TAIL COLOR", self.tail_color_picker, (WIDTH/2, HEIGHT/1.7 - 60))
+            snake.tail_color = self.tail_color_picker.get_color()
+
+            PROFILER.lap("color_menu")
+
+        if PROFILER.enabled:
+            BACKEND.blit(self.render_hud(), (4, 4))
+            PROFILER.lap("hud")
+
+        present()
+        PROFILER.lap("display")
+
+        if CAPTURE:
+            CAPTURE.grab(SCREEN)
+            PROFILER.lap("capture")
+
+        self.elapsed = clock.tick(PLAY_FPS)
+        PROFILER.lap("wait")
+
+        return self
+
+    # Show the frame timings in the top-left corner, on top of the arena.
+    # The text is only rendered again every PROFILE_HUD_REFRESH ms, but it
+    # is drawn on every frame, since moving cells may pass under it.
+
+    def draw_hud(self, dirty_rects):
+        rect = self.render_hud().get_rect(topleft=(4, 4))
+        area = rect.union(self.hud_rect) if self.hud_rect else rect
+        if not self.full_redraw:
+            restore_region(SCREEN, self.snake, area)
+        SCREEN.blit(self.hud, rect)
+        dirty_rects.append(area)
+        self.hud_rect = rect
+
+    # The overlay surface, rendered again if it is out of date.
+
+    def render_hud(self):
+        now = pygame.time.get_ticks()
+        if self.hud is None or now - self.hud_time >= PROFILE_HUD_REFRESH:
+            lines = [f"{'ms':<11}{'p50':>6}{'p95':>6}{'p99':>6}"]
+            for phase, entry in PROFILER.stats().items():
+                lines.append(f"{phase:<11}{entry['p50']:>6.2f}{entry['p95']:>6.2f}{entry['p99']:>6.2f}")
+
+            # Not through textcache: the numbers change all the time.
+            texts = [HUD_FONT.render(line, True, SCORE_COLOR) for line in lines]
+            line_height = HUD_FONT.get_linesize()
+            hud = pygame.Surface((max(text.get_width() for text in texts) + 8, line_height*len(texts) + 8), pygame.SRCALPHA)
+            hud.fill((0, 0, 0, 160))
+            for i, text in enumerate(texts):
+                hud.blit(text, (4, 4 + i*line_height))
+
+            self.hud, self.hud_time = hud, now
+        return self.hud
+
+    # The head rectangle moved part of the way towards the next cell, as
+    # far as the time elapsed since the last move.
+
+    def interpolated_head(self):
+        game = self.game
+        xmov, ymov = game.queue[0] if game.queue else game.direction
+        progress = min(self.lag * game.speed / 1000, 1)
+        shift = int(progress * GRID_SIZE)
+        return cell_rect(game, game.head).move(xmov * shift, ymov * shift)
+
+##
+## Game over
+##
+
+# Shown when the snake dies (or wins). Any key goes back to the same game,
+# with a new snake, as does the timeout (in ms) if given; a closing key goes
+# back to the menu.
 
-main_menu()
+class GameOverScene(Scene):
+
+    def __init__(self, play_scene, title, subtitle, timeout=None):
+        self.play_scene = play_scene
+        self.title, self.subtitle = title, subtitle
+        self.timeout = timeout
+
+    def enter(self):
+        if self.timeout is not None:
+            self.deadline = pygame.time.get_ticks() + self.timeout
+
+        # Show title and subtitle.
+
+        center_title = textcache.render(BIG_FONT, self.title, True, MESSAGE_COLOR)
+        center_title_rect = center_title.get_rect(center=(WIDTH/2, HEIGHT/2))
+        CANVAS.blit(center_title, center_title_rect)
+
+        center_subtitle = textcache.render(SMALL_FONT, self.subtitle, True, MESSAGE_COLOR)
+        center_subtitle_rect = center_subtitle.get_rect(center=(WIDTH/2, HEIGHT*2/3))
+        CANVAS.blit(center_subtitle, center_subtitle_rect)
+
+        present()
+        if CAPTURE:
+            CAPTURE.grab(SCREEN)
+
+    def exit(self):
+        self.play_scene = None
+
+    # Wait for a keypress or a game quit event (or the timeout).
+
+    def frame(self):
+        if self.timeout is None:
+            event = pygame.event.wait(MENU_IDLE_TIMEOUT)
+        else:
+            remaining = self.deadline - pygame.time.get_ticks()
+            if remaining <= 0:
+                return self.play_scene
+            event = pygame.event.wait(min(remaining, MENU_IDLE_TIMEOUT))
+
+        if event.type == pygame.QUIT:
+            return None
+        if event.type == pygame.KEYDOWN:
+            if event.key in CLOSING_KEYS:          # 'Q' goes back to the menu
+                return MenuScene()
+            return self.play_scene
+        return self
+
+##
+## Shared arena
+##
+
+# A game in a shared arena, run by arena_server.py: this scene only sends
+# the player's turns and shows the arena as the server describes it. As in
+# CellBuffer, the arena is kept as one pixel per cell, painted again only
+# where a tick changed something, and scaled up to the window.
+
+ARENA_TAIL_LIGHTNESS = 30    # The other snakes get a hue of their own, darker for the tail.
+
+ARENA_KEYS = {
+    pygame.K_UP: engine.UP, pygame.K_w: engine.UP,
+    pygame.K_DOWN: engine.DOWN, pygame.K_s: engine.DOWN,
+    pygame.K_LEFT: engine.LEFT, pygame.K_a: engine.LEFT,
+    pygame.K_RIGHT: engine.RIGHT, pygame.K_d: engine.RIGHT,
+}
+
+class ArenaScene(Scene):
+
+    # With play unset, the arena is only watched.
+    def __init__(self, host, port, play=True):
+        self.connection = arena_client.Connection(host, port, play)
+        self.view = None           # The arena, once the server sent it (see arena.View).
+        self.cells = None          # One pixel per cell.
+        self.colors = {}           # Snake id -> (head color, tail color).
+
+    def enter(self):
+        play_music('GAMEPLAY')
+        CANVAS.fill(SCREEN_COLOR)
+        waiting = textcache.render(SMALL_FONT, "Connecting...", True, MESSAGE_COLOR)
+        CANVAS.blit(waiting, waiting.get_rect(center=(WIDTH/2, HEIGHT/2)))
+        present()
+
+    def exit(self):
+        self.connection.close()
+
+    def frame(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return None
+            if event.type == assets.ASSET_LOADED:
+                asset_loaded()
+            if event.type == pygame.KEYDOWN:
+                if event.key in CLOSING_KEYS:
+                    return MenuScene()
+                elif event.key == MUTE_KEY:
+                    toggle_music()
+                elif event.key in ARENA_KEYS and self.view and self.view.player:
+                    self.connection.send_turn(ARENA_KEYS[event.key])
+
+        # Apply what the server sent since the last frame.
+
+        changed = []
+        try:
+            for kind, payload in self.connection.received():
+                if kind == arena.WELCOME:
+                    self.view = arena.View(payload)
+                    self.cells = pygame.Surface((self.view.cols, self.view.rows), depth=32)
+                    self.paint_all()
+                    changed = []        # Only what the next ticks change.
+                elif kind == arena.TICK and self.view:
+                    changed += self.view.apply(payload)
+        except arena.ProtocolError as error:
+            self.connection.error = error
+            self.connection.closed = True
+
+        if self.view:
+            for cell in changed:
+                self.paint(cell)
+            self.draw()
+
+        # The game over prompt is shown over the last frame (not presented).
+        if self.connection.closed:
+            reason = self.connection.error or "Server closed"
+            print(f"sucury: arena: {reason}", file=sys.stderr)
+            return GameOverScene(MenuScene(), "Disconnected", "Press to continue")
+
+        if self.view:
+            present()
+
+        clock.tick(PLAY_FPS)
+        return self
+
+    def snake_colors(self, snake_id):
+        if snake_id == self.view.player:
+            return HEAD_COLOR, TAIL_COLOR
+        if snake_id not in self.colors:
+            hue = snake_id * 67 % 360
+            tail = pygame.Color(0)
+            tail.hsla = (hue, 100, ARENA_TAIL_LIGHTNESS, 100)
+            self.colors[snake_id] = (hue_color(hue), tail)
+        return self.colors[snake_id]
+
+    # Paint the whole arena: the ground, then the snakes and the fruits.
+
+    def paint_all(self):
+        view = self.view
+        self.cells.fill(SCREEN_COLOR)
+        for body in view.snakes.values():
+            for cell in body:
+                self.paint(cell)
+        for cell in view.fruits:
+            self.paint(cell)
+
+    def paint(self, cell):
+        view = self.view
+        snake_id = view.occupant[cell]
+        if snake_id:
+            head, tail = self.snake_colors(snake_id)
+            color = head if view.snakes[snake_id][-1] == cell else tail
+        elif cell in view.fruits:
+            color = FRUIT_COLORS[view.fruits[cell]]
+        else:
+            color = SCREEN_COLOR
+        self.cells.set_at((cell % view.cols, cell // view.cols), color)
+
+    def draw(self):
+        view = self.view
+        size = max(1, min(WIDTH // view.cols, HEIGHT // view.rows))
+        rect = pygame.Rect(0, 0, view.cols*size, view.rows*size)
+        CANVAS.fill(SCREEN_COLOR)
+        if BACKEND:
+            BACKEND.draw(BACKEND.stream("arena", self.cells), rect)
+        else:
+            SCREEN.blit(pygame.transform.scale(self.cells, rect.size), rect)
+
+        # The player's score (while alive) and the number of snakes.
+        body = view.snakes.get(view.player)
+        text = f"{len(body) - 1}" if body else "-"
+        score = textcache.render(BIG_FONT, text, True, SCORE_COLOR)
+        CANVAS.blit(score, score.get_rect(center=(WIDTH/2, HEIGHT/20+HEIGHT/30)))
+        players = textcache.render(SMALL_FONT, f"Snakes: {len(view.snakes)}", True, SCORE_COLOR)
+        CANVAS.blit(players, players.get_rect(center=(WIDTH/3, HEIGHT/2+HEIGHT/3)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sucury, the snake game.")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="play in a shared arena (see arena_server.py)")
+    parser.add_argument("--watch", action="store_true", help="with --connect, watch the arena instead of playing")
+    parser.add_argument("--replay", metavar="FILE", help="play back a recorded game (e.g. last_game.sucr)")
+    parser.add_argument("--capture", metavar="FILE", help="save the game frames as raw video to FILE, or to the input of a command given as '|command'")
+    parser.add_argument("--headless", action="store_true", help="with --replay, no window: the frames are drawn as fast as possible")
+    parser.add_argument("--backend", choices=BACKENDS, default=RENDER_BACKEND,
+                        help="draw with blits on the display surface, or with the SDL renderer (texture: accelerated if possible; software: never)")
+    args = parser.parse_args()
+    RENDER_BACKEND = args.backend
+
+    first_scene = MenuScene
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        if not port.isdigit():
+            parser.error("--connect takes HOST:PORT")
+        first_scene = lambda: ArenaScene(host or "localhost", int(port), not args.watch)
+
+    if args.headless and not args.replay:
+        parser.error("--headless needs --replay (nobody could play)")
+
+    if args.replay:
+        try:
+            recording = replay.load(args.replay)
+        except (OSError, replay.ReplayError) as error:
+            sys.exit(f"{args.replay}: {error}")
+
+        # A window that fits the recorded board exactly.
+        GRID_SIZE = max(1, min(WIDTH // recording.cols, HEIGHT // recording.rows, GRID_SIZE_MAX))
+        WIDTH, HEIGHT = recording.cols * GRID_SIZE, recording.rows * GRID_SIZE
+        first_scene = lambda: PlayScene(recording=recording)
+
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = os.environ["SDL_AUDIODRIVER"] = "dummy"
+        clock = capture.FrameClock(PLAY_FPS)
+        REPLAY_END_DELAY = 0
+
+    # Offline, every frame is written (the game waits for the writer).
+    if args.capture:
+        try:
+            CAPTURE = capture.Capture(args.capture, block=args.headless)
+        except OSError as error:
+            sys.exit(f"{args.capture}: {error}")
+
+    # Played games are logged (not replays, nor shared arenas, run by the server).
+    event_log = None
+    if ANALYTICS_DIR and not (args.replay or args.connect):
+        try:
+            event_log = analytics.EventLog(ANALYTICS_DIR)
+            EVENTS.listen(event_log)
+        except OSError as error:
+            print(f"Could not log events: {error}", file=sys.stderr)
+    session_start = time.monotonic()
+    emit("session_start")
+
+    init()
+    run(first_scene())
+
+    emit("session_end", best=SESSION_BEST, games=SESSION_GAMES, seconds=round(time.monotonic() - session_start, 1))
+    if event_log:
+        event_log.close()
+    ASSETS.close()
+    HIGH_SCORES.close()
+    if PROFILER.samples:
+        PROFILER.dump(PROFILE_FILE)
+    if CAPTURE:
+        CAPTURE.close()
+        print(CAPTURE.summary(PLAY_FPS), file=sys.stderr)
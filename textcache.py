@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Rendering text with pygame.font is expensive compared to blitting an
+# existing surface, and the game shows the same few labels over and over.
+# This module keeps the rendered surfaces around, so that each distinct
+# (font, text, color, antialias) is rendered only once while it is in use.
+#
+#    surface = render(BIG_FONT, "MENU", True, "#b68f40")
+
+from collections import OrderedDict
+
+import pygame
+
+TEXT_CACHE_SIZE = 256        # How many rendered texts to keep.
+
+class TextCache:
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfaces = OrderedDict()   # Least recently used first.
+        self.hits = 0
+        self.misses = 0
+
+    # Same arguments as pygame.font.Font.render().
+
+    def render(self, font, text, antialias, color):
+
+        # pygame.Color is not hashable; use its components instead.
+        if isinstance(color, pygame.Color):
+            color = tuple(color)
+
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)   # Evict the least recently used.
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.surfaces)}
+
+# The cache shared by the whole game.
+
+TEXT_CACHE = TextCache()
+
+def render(font, text, antialias, color):
+    return TEXT_CACHE.render(font, text, antialias, color)
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+#
+#   Copyright (c) 2023 by Sucury Authors
+#
+#   This file is part of Sucury.
+#
+#   Sucury is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Rank snake-steering policies (see policies.py) over many seeded games.
+#
+#    python3 tournament.py greedy random --games 100000 --size 13
+#
+# Games are split into chunks of consecutive seeds and played by a pool of
+# worker processes, using only the headless engine (no display needed).
+# Each chunk comes back as a packed array of (score, ticks, cause) per game,
+# and the results are aggregated as they arrive. Game n of every policy
+# uses seed SEED + n, so runs are reproducible whatever the worker count.
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+
+import engine
+import policies
+
+TIMEOUT = 5   # Cause: the game hit the tick limit (engine events are 0..4).
+
+CAUSES = {engine.WALL: "wall", engine.BITE: "bite", engine.WIN: "win", TIMEOUT: "timeout"}
+
+# Play a chunk of games in a worker process. Returns the results packed as
+# consecutive (score, ticks, cause) integers.
+
+def play_chunk(job):
+    name, cols, rows, first_seed, count, max_ticks = job
+    factory = policies.get_policy(name)
+    step = engine.step
+    results = array("i")
+
+    for seed in range(first_seed, first_seed + count):
+        game = engine.new_game(cols, rows, seed)
+        policy = factory(game)
+        event = engine.NOTHING
+        while game.alive and game.tick < max_ticks:
+            game, event = step(game, policy(game))
+        cause = event if not game.alive else TIMEOUT
+        results.extend((game.score, game.tick, cause))
+
+    return name, results.tobytes()
+
+##
+## Aggregation.
+##
+
+class Results:
+
+    def __init__(self, name):
+        self.name = name
+        self.scores = array("i")
+        self.ticks = array("i")
+        self.causes = dict.fromkeys(CAUSES.values(), 0)
+
+    def add(self, packed):
+        values = array("i")
+        values.frombytes(packed)
+        self.scores.extend(values[0::3])
+        self.ticks.extend(values[1::3])
+        for cause in values[2::3]:
+            self.causes[CAUSES[cause]] += 1
+
+    def summary(self):
+        scores = sorted(self.scores)
+        games = len(scores)
+        percentile = lambda p: scores[min(int(p * games), games - 1)] if games else 0
+        return {
+            "policy": self.name,
+            "games": games,
+            "score_mean": sum(scores) / games if games else 0,
+            "score_p50": percentile(0.5),
+            "score_p90": percentile(0.9),
+            "score_p99": percentile(0.99),
+            "score_max": scores[-1] if games else 0,
+            "ticks_mean": sum(self.ticks) / games if games else 0,
+            "ticks_max": max(self.ticks) if games else 0,
+            "causes": dict(self.causes),
+            "score_histogram": histogram(scores),
+        }
+
+# Count of games per score.
+
+def histogram(scores):
+    counts = {}
+    for score in scores:
+        counts[score] = counts.get(score, 0) + 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank Sucury policies over many seeded games.")
+    parser.add_argument("policies", nargs="+", help=f"policy names ({', '.join(policies.POLICIES)}) or module:factory")
+    parser.add_argument("--games", type=int, default=10000, help="games per policy")
+    parser.add_argument("--size", type=int, default=13, help="board size, in cells")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--max-ticks", type=int, default=100000, help="moves before a game is stopped")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk", type=int, default=200, help="games per job")
+    parser.add_argument("--json", help="write the full results to this file")
+    args = parser.parse_args()
+
+    for name in args.policies:
+        try:
+            policies.get_policy(name)
+        except (KeyError, ImportError, AttributeError) as error:
+            sys.exit(f"tournament: {error}")
+
+    jobs = [(name, args.size, args.size, args.seed + first, min(args.chunk, args.games - first), args.max_ticks)
+            for name in args.policies for first in range(0, args.games, args.chunk)]
+    results = {name: Results(name) for name in args.policies}
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for name, packed in pool.imap_unordered(play_chunk, jobs):
+            results[name].add(packed)
+    elapsed = time.perf_counter() - start
+
+    summaries = sorted((result.summary() for result in results.values()),
+                       key=lambda summary: summary["score_mean"], reverse=True)
+
+    total_games = sum(summary["games"] for summary in summaries)
+    total_ticks = sum(sum(result.ticks) for result in results.values())
+
+    print(f"{'rank':<5}{'policy':<16}{'mean':>8}{'p50':>6}{'p90':>6}{'max':>6}{'ticks':>9}"
+          f"{'wall':>8}{'bite':>8}{'win':>6}{'timeout':>9}")
+    for rank, summary in enumerate(summaries, 1):
+        causes = summary["causes"]
+        print(f"{rank:<5}{summary['policy']:<16}{summary['score_mean']:>8.2f}{summary['score_p50']:>6}"
+              f"{summary['score_p90']:>6}{summary['score_max']:>6}{summary['ticks_mean']:>9.1f}"
+              f"{causes['wall']:>8}{causes['bite']:>8}{causes['win']:>6}{causes['timeout']:>9}")
+    print(f"\n{total_games} games, {total_ticks} moves in {elapsed:.2f} s with {args.workers} workers "
+          f"({total_games / elapsed:,.0f} games/s, {total_ticks / elapsed:,.0f} moves/s)")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"board": [args.size, args.size], "seed": args.seed, "elapsed": elapsed,
+                       "results": summaries}, file, indent=2)
+
+if __name__ == "__main__":
+    main()